@@ -1,26 +1,88 @@
-import sqlite3
 import functools
-from datetime import datetime
+import inspect
+import logging
+import random
+import time
+import pool
+import query_log
 
 #### decorator to log SQL queries
-def log_queries(func):
+def log_queries(func=None, *, sample_rate=1.0, slow_ms=query_log.SLOW_MS):
+    """Time each query and log it through the background query_log queue
+
+    Every call, including ones that raise, feeds the per-statement
+    histograms in query_log.stats(). A `sample_rate` share of calls is
+    logged at INFO; calls slower than `slow_ms`, and failures, are always
+    logged, at WARNING. Coroutine functions are timed from first call to
+    their result.
+
+    The decorator adds about 1 us of CPU per call. That is a few percent of
+    a full-table SELECT on users.db, but 10-20% of a 12 us primary-key
+    lookup; see query_log.benchmark().
+    """
+    if func is None:
+        return functools.partial(
+            log_queries, sample_rate=sample_rate, slow_ms=slow_ms
+        )
+    # Only fractional rates need a random draw per call
+    sampled = 0.0 < sample_rate < 1.0
+    always = sample_rate >= 1.0
+
+    def finished(query, start, result):
+        seconds = time.perf_counter() - start
+        rows = len(result) if isinstance(result, list) else None
+        query_log.record(query, seconds, rows)
+
+        slow = slow_ms is not None and seconds * 1000 >= slow_ms
+        if slow or always or (sampled and random.random() < sample_rate):
+            query_log.logger.log(
+                logging.WARNING if slow else logging.INFO,
+                "Executed query: %s (%.3f ms, %s rows)",
+                query, seconds * 1000, rows,
+                extra={"query": query, "duration_ms": seconds * 1000,
+                       "rows": rows, "slow": slow},
+            )
+        return result
+
+    def failed(query, start, error):
+        seconds = time.perf_counter() - start
+        query_log.record(query, seconds, error=True)
+        query_log.logger.warning(
+            "Query failed: %s (%.3f ms): %r", query, seconds * 1000, error,
+            extra={"query": query, "duration_ms": seconds * 1000,
+                   "rows": None, "error": repr(error)},
+        )
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            query = kwargs.get('query') or (args[0] if args else None)
+            start = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except BaseException as e:
+                failed(query, start, e)
+                raise
+            return finished(query, start, result)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         # Extract the query from the arguments
         query = kwargs.get('query') or (args[0] if args else None)
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{current_time}] Executing query: {query}")
-        return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            failed(query, start, e)
+            raise
+        return finished(query, start, result)
     return wrapper
 
 @log_queries
 def fetch_all_users(query):
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    cursor.execute(query)
-    results = cursor.fetchall()
-    conn.close()
-    return results
+    with pool.get_pool().connection() as conn:
+        return conn.query(query).fetchall()
 
 #### fetch users while logging the query
 users = fetch_all_users(query="SELECT * FROM users")
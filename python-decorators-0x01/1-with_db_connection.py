@@ -1,11 +1,17 @@
 import sqlite3
 import functools
+import inspect
+import async_pool
+import pool
 
 def with_db_connection(func):
+    if inspect.iscoroutinefunction(func):
+        return async_pool.with_connection(func)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Open a new database connection
-        conn = sqlite3.connect('users.db')
+        # Borrow a pooled connection instead of opening one per call
+        conn = pool.get_pool().acquire()
         try:
             # Pass the connection as the first argument if not already provided
             if 'conn' not in kwargs and not (args and isinstance(args[0], sqlite3.Connection)):
@@ -14,14 +20,13 @@ def with_db_connection(func):
             result = func(*args, **kwargs)
             return result
         finally:
-            # Ensure the connection is closed even if an error occurs
+            # Hand the connection back to the pool even if an error occurs
             conn.close()
     return wrapper
 
 @with_db_connection
 def get_user_by_id(conn, user_id):
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+    cursor = conn.query("SELECT * FROM users WHERE id = ?", (user_id,))
     return cursor.fetchone()
 
 # Fetch user by ID with automatic connection handling
@@ -1,48 +1,85 @@
 import sqlite3
 import functools
+import inspect
+import async_pool
+import batch
+import cache
+import pool
 
 def with_db_connection(func):
+    if inspect.iscoroutinefunction(func):
+        return async_pool.with_connection(func)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
+        # Inside batch.batch_transaction() every call shares its connection
+        active = batch.current()
+        conn = active.conn if active is not None else pool.get_pool().acquire()
         try:
             if 'conn' not in kwargs and not (args and isinstance(args[0], sqlite3.Connection)):
                 kwargs['conn'] = conn
             result = func(*args, **kwargs)
             return result
         finally:
-            conn.close()
+            if active is None:
+                conn.close()
     return wrapper
 
 def transactional(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
+    def find_connection(args, kwargs):
         conn = None
         # Find the connection in args or kwargs
         for arg in args:
-            if isinstance(arg, sqlite3.Connection):
+            if isinstance(arg, sqlite3.Connection) or async_pool.is_connection(arg):
                 conn = arg
                 break
         if 'conn' in kwargs:
             conn = kwargs['conn']
-        
-        if not conn:
+
+        if conn is None:
             raise ValueError("No database connection provided")
-        
+        return conn
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            conn = find_connection(args, kwargs)
+            try:
+                async with cache.atrack_tables(conn) as (_, writes):
+                    result = await func(*args, **kwargs)
+                await conn.commit()
+            except Exception as e:
+                await conn.rollback()
+                raise e
+            cache.invalidate(await async_pool.database_path(conn), writes)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        conn = find_connection(args, kwargs)
+
+        # Join the open batch instead of committing per call
+        active = batch.current()
+        if active is not None and active.conn is conn:
+            return active.run(func, args, kwargs)
+
         try:
-            result = func(*args, **kwargs)
+            # Note the tables written so cached reads of them can be dropped
+            with cache.track_tables(conn) as (_, writes):
+                result = func(*args, **kwargs)
             conn.commit()
-            return result
         except Exception as e:
             conn.rollback()
             raise e
+        cache.invalidate(cache.database_path(conn), writes)
+        return result
     return wrapper
 
 @with_db_connection
 @transactional
 def update_user_email(conn, user_id, new_email):
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+    conn.query("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
 
 # Update user's email with automatic transaction handling
 update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
@@ -1,11 +1,19 @@
 import time
+import asyncio
+import inspect
 import sqlite3
 import functools
+import async_pool
+import pool
+import retry
 
 def with_db_connection(func):
+    if inspect.iscoroutinefunction(func):
+        return async_pool.with_connection(func)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
+        conn = pool.get_pool().acquire()
         try:
             if 'conn' not in kwargs and not (args and isinstance(args[0], sqlite3.Connection)):
                 kwargs['conn'] = conn
@@ -15,27 +23,106 @@ def with_db_connection(func):
             conn.close()
     return wrapper
 
-def retry_on_failure(retries=3, delay=2):
+def retry_on_failure(retries=3, delay=2, max_delay=retry.MAX_DELAY,
+                     max_elapsed=None, retryable=retry.is_retryable,
+                     breaker=None):
+    """Retry transient failures with exponential back-off and full jitter
+
+    `retries` is the total number of attempts and `delay` the base of the
+    back-off. Only errors for which retryable(exc) is true are retried;
+    others are raised at once. No retry starts that would end after
+    `max_elapsed` seconds. `breaker` is a retry.CircuitBreaker (or True for
+    one per function) that fails calls fast while the database keeps
+    failing. Coroutine functions back off with asyncio.sleep. Counts are
+    kept in retry.stats().
+    """
     def decorator(func):
+        name = func.__qualname__
+        circuit = retry.CircuitBreaker() if breaker is True else breaker
+
+        def before_attempt():
+            if circuit is not None:
+                try:
+                    circuit.before_call()
+                except retry.CircuitOpen:
+                    retry.count(name, rejected=1)
+                    raise
+            retry.count(name, attempts=1)
+
+        def pause_after(exc, attempt, start):
+            # Seconds to sleep before the next attempt, or None to give up
+            transient = retryable(exc)
+            if circuit is not None:
+                # Always settle the call, or a half-open trial never ends
+                if transient:
+                    circuit.failed()
+                else:
+                    circuit.ignored()
+            pause = retry.backoff(attempt, delay, max_delay)
+            if (not transient or attempt == retries - 1 or (
+                    max_elapsed is not None
+                    and time.monotonic() - start + pause > max_elapsed)):
+                retry.count(name, failures=1)
+                return None
+            retry.count(name, retries=1, retry_seconds=pause)
+            return pause
+
+        def succeeded():
+            if circuit is not None:
+                circuit.succeeded()
+
+        def interrupted():
+            if circuit is not None:
+                circuit.ignored()
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                retry.count(name, calls=1)
+                start = time.monotonic()
+                for attempt in range(retries):
+                    before_attempt()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception as e:
+                        pause = pause_after(e, attempt, start)
+                        if pause is None:
+                            raise
+                        await asyncio.sleep(pause)
+                    except BaseException:
+                        interrupted()
+                        raise
+                    else:
+                        succeeded()
+                        return result
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            last_exception = None
+            retry.count(name, calls=1)
+            start = time.monotonic()
             for attempt in range(retries):
+                before_attempt()
                 try:
-                    return func(*args, **kwargs)
+                    result = func(*args, **kwargs)
                 except Exception as e:
-                    last_exception = e
-                    if attempt < retries - 1:
-                        time.sleep(delay)
-            raise last_exception
+                    pause = pause_after(e, attempt, start)
+                    if pause is None:
+                        raise
+                    time.sleep(pause)
+                except BaseException:
+                    interrupted()
+                    raise
+                else:
+                    succeeded()
+                    return result
         return wrapper
     return decorator
 
 @with_db_connection
 @retry_on_failure(retries=3, delay=1)
 def fetch_users_with_retry(conn):
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users")
+    cursor = conn.query("SELECT * FROM users")
     return cursor.fetchall()
 
 # Attempt to fetch users with automatic retry on failure
@@ -1,13 +1,19 @@
+import os
 import time
 import sqlite3
 import functools
-
-query_cache = {}
+import inspect
+import async_pool
+import cache
+import pool
 
 def with_db_connection(func):
+    if inspect.iscoroutinefunction(func):
+        return async_pool.with_connection(func)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
+        conn = pool.get_pool().acquire()
         try:
             if 'conn' not in kwargs and not (args and isinstance(args[0], sqlite3.Connection)):
                 kwargs['conn'] = conn
@@ -17,32 +23,138 @@ def with_db_connection(func):
             conn.close()
     return wrapper
 
-def cache_query(func):
+def cache_query(func=None, *, ttl=None, stale_ttl=0.0, store=None):
+    """Cache results in a bounded LRU keyed on database, query and params
+
+    Works bare (@cache_query) or configured (@cache_query(ttl=60)). Results
+    go to `store` or the shared cache.get_cache(); entries are dropped when
+    a @transactional write to a table they read commits. Concurrent misses
+    for one key run the query once. With stale_ttl, an expired result is
+    still returned for that many seconds while a connection to the same
+    database refreshes it in the background; results from in-memory
+    databases, which no other connection can open, are never served stale.
+    Coroutine functions on aiosqlite connections get the same cache,
+    coalescing on the event loop.
+    """
+    if func is None:
+        return functools.partial(
+            cache_query, ttl=ttl, stale_ttl=stale_ttl, store=store
+        )
+
+    def cache_key(database, conn, args, kwargs):
+        # Every argument except the connection itself; None if unhashable
+        rest = args[1:] if args and args[0] is conn else args
+        key = (database, rest, tuple(sorted(
+            (name, value) for name, value in kwargs.items() if name != 'conn'
+        )))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def is_database(database, path):
+        # Whether a pool's `path` names the database file in a cache key
+        return os.path.realpath(path) == os.path.realpath(database)
+
+    def rebind(conn, old, args, kwargs):
+        # The same call, made on `conn` instead of `old`
+        if args and args[0] is old:
+            return (conn,) + args[1:], kwargs
+        return args, dict(kwargs, conn=conn)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            query = kwargs.get('query') or (args[1] if len(args) > 1 else None)
+            conn = kwargs.get('conn') or (args[0] if args else None)
+            if not query or not async_pool.is_connection(conn):
+                return await func(*args, **kwargs)
+            database = await async_pool.database_path(conn)
+            key = cache_key(database, conn, args, kwargs)
+            if key is None:
+                return await func(*args, **kwargs)
+
+            async def run(target):
+                call_args, call_kwargs = rebind(target, conn, args, kwargs)
+                async with cache.atrack_tables(target) as (reads, _):
+                    result = await func(*call_args, **call_kwargs)
+                return result, {(database, table) for table in reads}
+
+            async def load():
+                loaded.append(True)
+                return await run(conn)
+
+            async def refresh():
+                shared = async_pool.get_pool()
+                if is_database(database, shared.database):
+                    async with shared.connection() as fresh:
+                        return await run(fresh)
+                fresh = await async_pool.AsyncConnectionPool(database).connect()
+                try:
+                    return await run(fresh)
+                finally:
+                    await fresh.close()
+
+            loaded = []
+            results = cache.get_cache() if store is None else store
+            result = await results.aget_or_load(
+                key, load, ttl, stale_ttl if database else 0.0, refresh
+            )
+            print("Caching new result" if loaded else "Returning cached result")
+            return result
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         # Get the query from either args or kwargs
         query = kwargs.get('query') or (args[1] if len(args) > 1 else None)
-        
-        if not query:
+        conn = kwargs.get('conn') or (args[0] if args else None)
+
+        if not query or not isinstance(conn, sqlite3.Connection):
             return func(*args, **kwargs)
-        
-        # Check if query is in cache
-        if query in query_cache:
-            print("Returning cached result")
-            return query_cache[query]
-        
-        # Execute and cache the result
-        result = func(*args, **kwargs)
-        query_cache[query] = result
-        print("Caching new result")
+        database = cache.database_path(conn)
+        key = cache_key(database, conn, args, kwargs)
+        if key is None:
+            return func(*args, **kwargs)
+
+        def run(target):
+            # Execute on `target`, noting which tables the query read
+            call_args, call_kwargs = rebind(target, conn, args, kwargs)
+            with cache.track_tables(target) as (reads, _):
+                result = func(*call_args, **call_kwargs)
+            return result, {(database, table) for table in reads}
+
+        def load():
+            loaded.append(True)
+            return run(conn)
+
+        def refresh():
+            # Runs after the caller's connection is gone, so it opens one
+            # to the database the key came from
+            shared = pool.get_pool()
+            if is_database(database, shared.database):
+                with shared.connection() as fresh:
+                    return run(fresh)
+            fresh = pool.ConnectionPool(database, max_size=1).connect()
+            try:
+                return run(fresh)
+            finally:
+                fresh.discard()
+
+        loaded = []
+        results = cache.get_cache() if store is None else store
+        result = results.get_or_load(
+            key, load, ttl, stale_ttl if database else 0.0, refresh
+        )
+        print("Caching new result" if loaded else "Returning cached result")
         return result
     return wrapper
 
 @with_db_connection
 @cache_query
 def fetch_users_with_cache(conn, query):
-    cursor = conn.cursor()
-    cursor.execute(query)
+    cursor = conn.query(query)
     return cursor.fetchall()
 
 # First call will cache the result
@@ -0,0 +1,194 @@
+import asyncio
+import collections
+import functools
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+try:
+    import aiosqlite
+except ImportError:  # only the coroutine versions of the decorators need it
+    aiosqlite = None
+
+import pool
+
+
+def is_connection(obj):
+    """True for an aiosqlite connection"""
+    return aiosqlite is not None and isinstance(obj, aiosqlite.Connection)
+
+
+class AsyncConnectionPool:
+    """Pool of aiosqlite connections for coroutines on one event loop
+
+    The async counterpart of pool.ConnectionPool: at most `max_size`
+    connections, acquire() waits up to `timeout` seconds and then raises
+    pool.PoolExhausted, new connections run `pragmas`, and reused ones are
+    pinged first.
+    """
+
+    def __init__(self, database=pool.DB_PATH, max_size=pool.MAX_SIZE,
+                 timeout=pool.CHECKOUT_TIMEOUT, pragmas=()):
+        if aiosqlite is None:
+            raise ImportError("Async database access requires aiosqlite")
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = pragmas
+        self._idle = collections.deque()
+        self._open = 0
+        self._cond = asyncio.Condition()
+        self._stats = collections.Counter()
+
+    async def connect(self):
+        conn = aiosqlite.connect(self.database)
+        # Idle pooled connections must not keep the process alive after the
+        # event loop is gone. The worker is conn._thread, or on aiosqlite
+        # before 0.20 the connection itself, and is started by the await.
+        getattr(conn, "_thread", conn).daemon = True
+        await conn
+        for name, value in self.pragmas:
+            await conn.execute(f"PRAGMA {name}={value}")
+        async with conn.execute("PRAGMA database_list") as cursor:
+            # Absolute path of the database file, used in cache keys
+            conn.path = (await cursor.fetchone())[2]
+        return conn
+
+    async def acquire(self):
+        """Borrow a connection; hand it back with release()"""
+        start = time.perf_counter()
+        async with self._cond:
+            if not self._idle and self._open >= self.max_size:
+                self._stats["waits"] += 1
+                try:
+                    await asyncio.wait_for(self._cond.wait_for(
+                        lambda: self._idle or self._open < self.max_size
+                    ), self.timeout)
+                except asyncio.TimeoutError:
+                    self._stats["timeouts"] += 1
+                    raise pool.PoolExhausted(
+                        f"No connection to {self.database} free within {self.timeout}s"
+                    ) from None
+                finally:
+                    self._stats["wait_seconds"] += time.perf_counter() - start
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._open += 1
+        if conn is not None:
+            if await self._healthy(conn):
+                self._stats["hits"] += 1
+                return conn
+            # Replace the dead connection in the slot it already holds
+            self._stats["discarded"] += 1
+            await self._close_quietly(conn)
+        self._stats["misses"] += 1
+        try:
+            return await self.connect()
+        except BaseException:
+            await self._release_slot()
+            raise
+
+    async def release(self, conn):
+        """Return a connection, rolling back anything left uncommitted"""
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+        except Exception:
+            await self._discard(conn)
+            return
+        async with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats.update(open=self._open, idle=len(self._idle))
+        for key in ("hits", "misses", "waits", "timeouts", "discarded",
+                    "wait_seconds"):
+            stats.setdefault(key, 0)
+        return stats
+
+    async def close(self):
+        """Close every idle connection"""
+        idle, self._idle = list(self._idle), collections.deque()
+        for conn in idle:
+            await self._discard(conn)
+
+    async def _healthy(self, conn):
+        try:
+            async with conn.execute("SELECT 1"):
+                return True
+        except Exception:
+            return False
+
+    async def _discard(self, conn):
+        self._stats["discarded"] += 1
+        await self._close_quietly(conn)
+        await self._release_slot()
+
+    async def _close_quietly(self, conn):
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+    async def _release_slot(self):
+        async with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+
+# One pool per event loop, since aiosqlite futures belong to a loop
+_pools = weakref.WeakKeyDictionary()
+_settings = {}
+
+
+def get_pool():
+    """Return the running loop's users.db pool, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    async_pool = _pools.get(loop)
+    if async_pool is None:
+        async_pool = _pools[loop] = AsyncConnectionPool(**_settings)
+    return async_pool
+
+
+async def close():
+    """Close the running loop's pool, e.g. when a service shuts down"""
+    async_pool = _pools.pop(asyncio.get_running_loop(), None)
+    if async_pool is not None:
+        await async_pool.close()
+
+
+def configure(**kwargs):
+    """Build pools from now on with these AsyncConnectionPool kwargs"""
+    _settings.clear()
+    _settings.update(kwargs)
+    _pools.clear()
+
+
+async def database_path(conn):
+    """File path of the connection's main database ('' when in memory)"""
+    path = getattr(conn, "path", None)
+    if path is None:
+        async with conn.execute("PRAGMA database_list") as cursor:
+            path = (await cursor.fetchone())[2]
+    return path
+
+
+def with_connection(func):
+    """with_db_connection for coroutine functions"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        async with get_pool().connection() as conn:
+            if 'conn' not in kwargs and not (args and is_connection(args[0])):
+                kwargs['conn'] = conn
+            return await func(*args, **kwargs)
+    return wrapper
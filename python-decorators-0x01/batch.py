@@ -0,0 +1,161 @@
+import itertools
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import cache
+import pool
+
+# Flush a batch once any of these is reached
+MAX_CALLS = 1000
+MAX_BYTES = 1 * 2**20
+MAX_SECONDS = 1.0
+
+_local = threading.local()
+
+
+class Batch:
+    """Group commit for @transactional calls on one connection
+
+    Calls share one transaction, each inside its own SAVEPOINT, so a call
+    that raises is rolled back alone and the rest of the batch carries
+    on. The transaction commits once `max_calls` calls, `max_bytes` of
+    call arguments or `max_seconds` since it began have accumulated
+    (checked as each call finishes), and when the batch scope ends.
+    """
+
+    def __init__(self, conn, max_calls=MAX_CALLS, max_bytes=MAX_BYTES,
+                 max_seconds=MAX_SECONDS):
+        self.conn = conn
+        self.max_calls = max_calls
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.commits = 0
+        self.calls = 0
+        self._savepoints = itertools.count()
+        self._reset()
+
+    def run(self, func, args, kwargs):
+        """Run one @transactional call inside a savepoint of the batch"""
+        conn = self.conn
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+            self._began = time.monotonic()
+        name = f"batch_call_{next(self._savepoints)}"
+        conn.execute(f"SAVEPOINT {name}")
+        try:
+            with cache.track_tables(conn) as (_, writes):
+                result = func(*args, **kwargs)
+        except Exception:
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+            raise
+        conn.execute(f"RELEASE {name}")
+
+        self.calls += 1
+        self._pending += 1
+        self._bytes += cache.sizeof(
+            [arg for arg in args if arg is not conn]
+        ) + cache.sizeof({k: v for k, v in kwargs.items() if v is not conn})
+        self._writes |= writes
+        if (self._pending >= self.max_calls or self._bytes >= self.max_bytes
+                or time.monotonic() - self._began >= self.max_seconds):
+            self.flush()
+        return result
+
+    def flush(self):
+        """Commit everything batched so far"""
+        if self.conn.in_transaction:
+            self.conn.commit()
+            self.commits += 1
+        cache.invalidate(cache.database_path(self.conn), self._writes)
+        self._reset()
+
+    def rollback(self):
+        """Drop everything batched since the last flush"""
+        if self.conn.in_transaction:
+            self.conn.rollback()
+        self._reset()
+
+    def _reset(self):
+        self._pending = 0
+        self._bytes = 0
+        self._began = time.monotonic()
+        self._writes = set()
+
+
+def current():
+    """The batch open on this thread, or None"""
+    return getattr(_local, "batch", None)
+
+
+@contextmanager
+def batch_transaction(conn=None, **limits):
+    """Batch every @transactional call on this thread into group commits
+
+    with_db_connection hands the batch's connection (`conn`, or one from
+    the pool) to calls made inside the block. Leaving the block commits
+    what is left; an exception escaping it rolls back the calls since the
+    last flush. Nested blocks join the outer batch. `limits` are Batch
+    keyword arguments.
+    """
+    outer = current()
+    if outer is not None:
+        yield outer
+        return
+    owns_conn = conn is None
+    if owns_conn:
+        conn = pool.get_pool().acquire()
+    batch = _local.batch = Batch(conn, **limits)
+    try:
+        yield batch
+    except BaseException:
+        batch.rollback()
+        raise
+    else:
+        batch.flush()
+    finally:
+        _local.batch = None
+        if owns_conn:
+            conn.close()
+
+
+def benchmark(calls=2000, max_calls=MAX_CALLS):
+    """Commits and calls per second for update_user_email, one commit per
+    call vs batched; emails are rewritten with their current values"""
+    update_user_email = __import__('2-transactional').update_user_email
+    with pool.get_pool().connection() as conn:
+        users = conn.execute("SELECT id, email FROM users").fetchall()
+    updates = list(itertools.islice(itertools.cycle(users), calls))
+
+    results = {}
+    for label in ("per_call", "batched"):
+        start = time.perf_counter()
+        if label == "batched":
+            with batch_transaction(max_calls=max_calls) as batch:
+                for user_id, email in updates:
+                    update_user_email(user_id=user_id, new_email=email)
+            commits = batch.commits
+        else:
+            for user_id, email in updates:
+                update_user_email(user_id=user_id, new_email=email)
+            commits = calls
+        elapsed = time.perf_counter() - start
+        results[label] = {
+            "calls": calls,
+            "commits": commits,
+            "seconds": elapsed,
+            "calls_per_sec": calls / elapsed,
+            "commits_per_sec": commits / elapsed,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    # Let 2-transactional share this copy of the module and its batches
+    sys.modules.setdefault("batch", sys.modules[__name__])
+    for label, result in benchmark().items():
+        print(f"{label:>9}: {result['calls_per_sec']:.0f} calls/s, "
+              f"{result['commits']} commits "
+              f"({result['commits_per_sec']:.0f} commits/s)")
@@ -0,0 +1,651 @@
+import asyncio
+import collections
+import functools
+import itertools
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+import pool
+
+# Defaults for the shared query cache; override with configure()
+MAX_ENTRIES = 1024
+MAX_BYTES = 64 * 2**20
+TTL = 300.0
+# Results larger than this are returned but never cached
+MAX_ENTRY_ROWS = 10_000
+MAX_ENTRY_BYTES = 4 * 2**20
+# Empty results are cached too, but only this long
+NEGATIVE_TTL = 5.0
+
+# Authorizer actions whose first argument is a table being written
+_WRITE_ACTIONS = {
+    sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE, sqlite3.SQLITE_DELETE,
+    sqlite3.SQLITE_DROP_TABLE, sqlite3.SQLITE_ALTER_TABLE,
+}
+
+Entry = collections.namedtuple(
+    "Entry", "value size rows expires stale_until tables"
+)
+
+
+class _Flight:
+    """One in-progress load that concurrent misses wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _Abandoned(Exception):
+    """The coroutine leading a load was cancelled; waiters load again"""
+
+
+def sizeof(value):
+    """Rough deep size in bytes of a query result (lists/tuples of scalars)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(sizeof(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    return size
+
+
+class FrequencySketch:
+    """Count-min sketch of how often keys are looked up (TinyLFU)
+
+    Every `sample_size` increments all counters are halved, so the
+    estimates favour recent popularity over all-time totals.
+    """
+
+    def __init__(self, width=4096, depth=4, sample_size=None):
+        self.width = width
+        self.depth = depth
+        self.sample_size = sample_size or 10 * width
+        self._rows = [[0] * width for _ in range(depth)]
+        self._increments = 0
+
+    def _slots(self, key):
+        h = hash(key)
+        return [hash((i, h)) % self.width for i in range(self.depth)]
+
+    def increment(self, key):
+        for row, slot in zip(self._rows, self._slots(key)):
+            row[slot] += 1
+        self._increments += 1
+        if self._increments >= self.sample_size:
+            for row in self._rows:
+                row[:] = [count >> 1 for count in row]
+            self._increments //= 2
+
+    def estimate(self, key):
+        return min(row[slot] for row, slot in zip(self._rows, self._slots(key)))
+
+
+def is_empty(value):
+    """True for "no rows" results: None or an empty list/tuple"""
+    return value is None or (isinstance(value, (list, tuple)) and not value)
+
+
+def row_count(value):
+    """Rows in a result: a fetchall() list, a fetchone() row or None"""
+    if value is None:
+        return 0
+    if isinstance(value, list):
+        return len(value)
+    if isinstance(value, (tuple, sqlite3.Row)):
+        return 1 if len(value) else 0
+    return None
+
+
+def database_path(conn):
+    """File path of the connection's main database ('' when in memory)"""
+    path = getattr(conn, "path", None)
+    if path is None:
+        path = conn.execute("PRAGMA database_list").fetchone()[2]
+    return path
+
+
+class QueryCache:
+    """Thread-safe LRU cache of query results
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once there are more than `max_entries` or their estimated size
+    exceeds `max_bytes`. Each entry remembers the tables it read so a write
+    to any of them can drop it (see invalidate()).
+
+    get_or_load() makes concurrent misses on one key share a single load
+    (coalesce=False turns that off, for comparison in benchmark()), and
+    aget_or_load() does the same for coroutines on an event loop.
+
+    Results over `max_entry_rows` rows or `max_entry_bytes` bytes are not
+    admitted, and empty results only live for `negative_ttl` seconds. With
+    tinylfu=True a new entry that would force an eviction is only admitted
+    if its key has been looked up more often than the entry it would evict.
+
+    `l2` is an optional second-level store such as disk_cache.DiskCache:
+    misses are looked up there before running the query, and fresh
+    results are written through to it. Keys it has no digest() for skip it.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl=TTL,
+                 coalesce=True, max_entry_rows=MAX_ENTRY_ROWS,
+                 max_entry_bytes=MAX_ENTRY_BYTES, negative_ttl=NEGATIVE_TTL,
+                 tinylfu=False, l2=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.coalesce = coalesce
+        self.max_entry_rows = max_entry_rows
+        self.max_entry_bytes = max_entry_bytes
+        self.negative_ttl = negative_ttl
+        self._sketch = FrequencySketch() if tinylfu else None
+        self.l2 = l2
+        self._flights = {}
+        # Key -> asyncio.Future of the coroutine load for it, and the
+        # background refresh tasks, kept referenced until they finish
+        self._async_flights = {}
+        self._tasks = set()
+        # Bumped by invalidate()/clear() so loads that started before a
+        # write do not store what they read
+        self._epoch = 0
+        self._entries = collections.OrderedDict()
+        # (database, table) -> keys of entries that read it
+        self._by_table = collections.defaultdict(set)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._stats = collections.Counter()
+        _caches.add(self)
+
+    def get(self, key, default=None):
+        """Return the live value for `key`, counting a hit or a miss"""
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            if entry is None or entry.expires <= time.monotonic():
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.value
+
+    def get_or_load(self, key, load, ttl=None, stale_ttl=0.0, refresh=None):
+        """Return the value for `key`, calling load() once on a miss
+
+        load() returns (value, tables). Threads that miss while a load for
+        the same key is running wait for it instead of starting their own.
+        With stale_ttl > 0 an entry up to that many seconds past its TTL is
+        returned as is while refresh() (default load) runs in a background
+        thread to replace it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            entry = self._live(key, now)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.expires > now:
+                    self._stats["hits"] += 1
+                    return entry.value
+                self._stats["stale_hits"] += 1
+                if key not in self._flights:
+                    flight = self._flights[key] = _Flight()
+                    threading.Thread(
+                        target=self._refresh, daemon=True,
+                        args=(key, flight, refresh or load, ttl, stale_ttl),
+                    ).start()
+                return entry.value
+            self._stats["misses"] += 1
+            flight = self._flights.get(key) if self.coalesce else None
+            if flight is None:
+                flight = _Flight()
+                if self.coalesce:
+                    self._flights[key] = flight
+                leader = True
+            else:
+                self._stats["coalesced"] += 1
+                leader = False
+        if leader:
+            return self._load(key, flight, load, ttl, stale_ttl)
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    async def aget_or_load(self, key, load, ttl=None, stale_ttl=0.0,
+                           refresh=None):
+        """get_or_load() for coroutines: `load` and `refresh` are async"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            now = time.monotonic()
+            entry = self._live(key, now)
+            flight = self._async_flights.get(key)
+            if flight is not None and flight.get_loop() is not loop:
+                flight = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.expires > now:
+                    self._stats["hits"] += 1
+                    return entry.value
+                self._stats["stale_hits"] += 1
+                if flight is None:
+                    flight = self._async_flights[key] = loop.create_future()
+                    task = loop.create_task(self._arefresh(
+                        key, flight, refresh or load, ttl, stale_ttl
+                    ))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                return entry.value
+            self._stats["misses"] += 1
+            if flight is None or not self.coalesce:
+                flight = loop.create_future()
+                if self.coalesce:
+                    self._async_flights[key] = flight
+                leader = True
+            else:
+                self._stats["coalesced"] += 1
+                leader = False
+        if leader:
+            return await self._aload(key, flight, load, ttl, stale_ttl)
+        # Shielded so a waiter being cancelled does not cancel the load
+        try:
+            return await asyncio.shield(flight)
+        except _Abandoned:
+            return await self.aget_or_load(key, load, ttl, stale_ttl, refresh)
+
+    def set(self, key, value, tables=(), ttl=None, stale_ttl=0.0):
+        """Store `value` if admitted; `tables` are (database, table) pairs
+        it came from. Returns whether it was stored."""
+        rows = row_count(value)
+        if not self._cacheable(value):
+            return self._reject("too_large")
+        size = sizeof(value)
+        if size > min(self.max_bytes, self.max_entry_bytes or self.max_bytes):
+            return self._reject("too_large")
+        if is_empty(value) and self.negative_ttl is not None:
+            stale_ttl = 0.0
+        ttl = self._ttl_for(value, ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            elif not self._admit(key, size):
+                self._stats["rejected_frequency"] += 1
+                return False
+            expires = time.monotonic() + ttl
+            self._entries[key] = Entry(
+                value, size, rows, expires, expires + stale_ttl,
+                frozenset(tables)
+            )
+            self._bytes += size
+            for table in tables:
+                self._by_table[table].add(key)
+            while (len(self._entries) > self.max_entries
+                   or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+        return True
+
+    def invalidate(self, database, tables):
+        """Drop every entry that read one of `tables` in `database`"""
+        with self._lock:
+            keys = set()
+            for table in tables:
+                keys |= self._by_table.get((database, table.lower()), set())
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+            self._epoch += 1
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+            self._epoch += 1
+
+    def memory_report(self, top=10):
+        """Where the cache's memory goes: totals, empty (negative) entries,
+        bytes per table and the `top` largest entries"""
+        with self._lock:
+            entries = list(self._entries.items())
+            total = self._bytes
+        by_table = collections.Counter()
+        negative = 0
+        for _, entry in entries:
+            if is_empty(entry.value):
+                negative += 1
+            for database, table in entry.tables:
+                by_table[table] += entry.size
+        largest = sorted(entries, key=lambda item: item[1].size, reverse=True)
+        return {
+            "entries": len(entries),
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "fill": total / self.max_bytes if self.max_bytes else None,
+            "negative_entries": negative,
+            "bytes_by_table": dict(by_table),
+            "largest": [
+                {"key": repr(key)[:200], "bytes": entry.size, "rows": entry.rows}
+                for key, entry in largest[:top]
+            ],
+        }
+
+    def stats(self):
+        """Hits, misses, coalesced waits, evictions, invalidations and size"""
+        with self._lock:
+            stats = dict(self._stats)
+            in_flight = len(self._flights) + len(self._async_flights)
+            stats.update(entries=len(self._entries), bytes=self._bytes,
+                         in_flight=in_flight)
+        for key in ("hits", "misses", "stale_hits", "coalesced", "loads",
+                    "refreshes", "refresh_errors", "evictions", "expirations",
+                    "invalidations", "negative_hits", "rejected_too_large",
+                    "rejected_frequency", "l2_hits"):
+            stats.setdefault(key, 0)
+        return stats
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _live(self, key, now):
+        # The entry for `key` unless it is past its stale window. Every
+        # lookup comes through here, so it also feeds the TinyLFU sketch.
+        if self._sketch is not None:
+            self._sketch.increment(key)
+        entry = self._entries.get(key)
+        if entry is not None and entry.stale_until <= now:
+            self._remove(key)
+            self._stats["expirations"] += 1
+            entry = None
+        if entry is not None and is_empty(entry.value) and entry.expires > now:
+            self._stats["negative_hits"] += 1
+        return entry
+
+    def _admit(self, key, size):
+        # TinyLFU: when storing `key` would evict, keep it out unless it is
+        # looked up more often than the least recently used entry
+        if self._sketch is None or not self._entries:
+            return True
+        if (len(self._entries) < self.max_entries
+                and self._bytes + size <= self.max_bytes):
+            return True
+        victim = next(iter(self._entries))
+        return self._sketch.estimate(key) > self._sketch.estimate(victim)
+
+    def _cacheable(self, value):
+        # Row limit only: sizing a huge result just to reject it is costly
+        if self.max_entry_rows is None:
+            return True
+        rows = row_count(value)
+        return rows is None or rows <= self.max_entry_rows
+
+    def _ttl_for(self, value, ttl):
+        if is_empty(value) and self.negative_ttl is not None:
+            return self.negative_ttl
+        return self.ttl if ttl is None else ttl
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _reject(self, reason):
+        self._count(f"rejected_{reason}")
+        return False
+
+    def _load(self, key, flight, load, ttl, stale_ttl):
+        epoch = self._epoch
+        try:
+            digest = self.l2.digest(key) if self.l2 is not None else None
+            stored = self.l2.get(digest) if digest is not None else None
+            if stored is not None:
+                value, tables = stored
+                self._count("l2_hits")
+            else:
+                value, tables = load()
+                self._count("loads")
+                if digest is not None and self._cacheable(value):
+                    self.l2.set(digest, value, tables, self._ttl_for(value, ttl))
+            with self._lock:
+                if self._epoch == epoch:
+                    self.set(key, value, tables, ttl, stale_ttl)
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def _refresh(self, key, flight, load, ttl, stale_ttl):
+        try:
+            self._load(key, flight, load, ttl, stale_ttl)
+            with self._lock:
+                self._stats["refreshes"] += 1
+        except Exception:
+            # The stale value stays until its window ends; the next
+            # stale hit tries again
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+
+    async def _aload(self, key, flight, load, ttl, stale_ttl):
+        epoch = self._epoch
+        try:
+            # The disk tier is blocking SQLite, so it runs off the loop
+            digest = stored = None
+            if self.l2 is not None:
+                digest = self.l2.digest(key)
+            if digest is not None:
+                stored = await asyncio.to_thread(self.l2.get, digest)
+            if stored is not None:
+                value, tables = stored
+                self._count("l2_hits")
+            else:
+                value, tables = await load()
+                self._count("loads")
+                if digest is not None and self._cacheable(value):
+                    await asyncio.to_thread(
+                        self.l2.set, digest, value, tables,
+                        self._ttl_for(value, ttl)
+                    )
+            with self._lock:
+                if self._epoch == epoch:
+                    self.set(key, value, tables, ttl, stale_ttl)
+            flight.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            # Only the leader was cancelled: hand the load to the waiters
+            # rather than cancelling them all with it
+            flight.set_exception(_Abandoned())
+            flight.exception()
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            # Mark it retrieved; waiters, if any, still see the error
+            flight.exception()
+            raise
+        finally:
+            with self._lock:
+                if self._async_flights.get(key) is flight:
+                    del self._async_flights[key]
+
+    async def _arefresh(self, key, flight, load, ttl, stale_ttl):
+        try:
+            await self._aload(key, flight, load, ttl, stale_ttl)
+            with self._lock:
+                self._stats["refreshes"] += 1
+        except Exception:
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for table in entry.tables:
+            keys = self._by_table[table]
+            keys.discard(key)
+            if not keys:
+                del self._by_table[table]
+
+
+# Every live cache, so a committed write can invalidate all of them
+_caches = weakref.WeakSet()
+
+# id(conn) -> [(reads, writes), ...] for each track_tables() block open on it
+_tracking = {}
+_tracking_lock = threading.Lock()
+
+
+def _authorize(trackers, action, arg1, arg2, dbname, source):
+    if arg1:
+        if action == sqlite3.SQLITE_READ:
+            for reads, _ in trackers:
+                reads.add(arg1.lower())
+        elif action in _WRITE_ACTIONS:
+            for _, writes in trackers:
+                writes.add(arg1.lower())
+    return sqlite3.SQLITE_OK
+
+
+def _start_tracking(conn):
+    # Register a (reads, writes) pair; returns it and the authorizer to
+    # install, or None when an outer block already installed one
+    tracker = (set(), set())
+    with _tracking_lock:
+        trackers = _tracking.setdefault(id(conn), [])
+        trackers.append(tracker)
+        first = len(trackers) == 1
+    return tracker, functools.partial(_authorize, trackers) if first else None
+
+
+def _stop_tracking(conn, tracker):
+    # Unregister `tracker`; True when the authorizer should be removed
+    with _tracking_lock:
+        trackers = _tracking[id(conn)]
+        trackers[:] = [t for t in trackers if t[0] is not tracker[0]]
+        if trackers:
+            return False
+        del _tracking[id(conn)]
+        return True
+
+
+@contextmanager
+def track_tables(conn):
+    """Collect the tables statements on `conn` read and write
+
+    Yields (reads, writes) sets that fill in as statements are prepared.
+    Blocks may nest on one connection; they share a single authorizer.
+
+    SQLite only consults an authorizer while preparing a statement, and
+    installing or removing one expires every prepared statement on the
+    connection. That is what makes statements cached before the block
+    report their tables, but it also means tracked calls (transactional
+    writes and cache_query misses) re-prepare their SQL instead of reusing
+    the connection's statement cache, and so does the next call after.
+    """
+    tracker, authorizer = _start_tracking(conn)
+    if authorizer is not None:
+        conn.set_authorizer(authorizer)
+    try:
+        yield tracker
+    finally:
+        if _stop_tracking(conn, tracker):
+            conn.set_authorizer(None)
+
+
+@asynccontextmanager
+async def atrack_tables(conn):
+    """track_tables() for an aiosqlite connection"""
+    tracker, authorizer = _start_tracking(conn)
+    if authorizer is not None:
+        await conn.set_authorizer(authorizer)
+    try:
+        yield tracker
+    finally:
+        if _stop_tracking(conn, tracker):
+            await conn.set_authorizer(None)
+
+
+def invalidate(database, tables):
+    """Drop entries that read any of `tables` from every cache"""
+    if not tables:
+        return 0
+    return sum(cache.invalidate(database, tables) for cache in list(_caches))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the module-wide query cache, creating it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = QueryCache()
+        return _cache
+
+
+def configure(**kwargs):
+    """Replace the shared cache with one built from QueryCache kwargs"""
+    global _cache
+    with _cache_lock:
+        _cache = QueryCache(**kwargs)
+    return _cache
+
+
+def benchmark(threads=16, calls=200, ttl=0.0, query="SELECT * FROM users"):
+    """Queries that reach users.db when `threads` threads each make `calls`
+    cached lookups of one hot query, for each cache mode
+
+    The default ttl=0 expires the entry as soon as it is stored, so every
+    lookup races to reload it: the worst case for a cache stampede.
+    """
+    modes = {
+        "uncoalesced": dict(coalesce=False),
+        "coalesced": dict(coalesce=True),
+        "stale_while_revalidate": dict(coalesce=True, stale_ttl=1.0),
+    }
+    results = {}
+    for label, mode in modes.items():
+        stale_ttl = mode.pop("stale_ttl", 0.0)
+        store = QueryCache(ttl=ttl, **mode)
+        executed = itertools.count()
+
+        def load():
+            with pool.get_pool().connection() as conn:
+                next(executed)
+                return conn.execute(query).fetchall(), ()
+
+        def worker():
+            barrier.wait()
+            for _ in range(calls):
+                store.get_or_load(query, load, stale_ttl=stale_ttl)
+
+        barrier = threading.Barrier(threads + 1)
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        results[label] = {
+            "calls": threads * calls,
+            "queries": next(executed),
+            "seconds": elapsed,
+            "calls_per_sec": threads * calls / elapsed,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    for label, result in benchmark().items():
+        print(f"{label:>22}: {result['queries']:>5} queries for "
+              f"{result['calls']} calls, {result['calls_per_sec']:.0f} calls/s")
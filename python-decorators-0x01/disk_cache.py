@@ -0,0 +1,199 @@
+import collections
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# Defaults for the on-disk cache shared by every process on the host
+CACHE_PATH = "query_cache.sqlite3"
+MAX_BYTES = 256 * 2**20
+MAX_ENTRY_BYTES = 16 * 2**20
+TTL = 3600.0
+# Expired and over-budget entries are pruned once every this many writes
+PRUNE_EVERY = 100
+
+
+# Header bytes that change on every commit: the database file change
+# counter, and the -wal checkpoint sequence number and salts
+_HEADER_FIELDS = {"": slice(24, 28), "-wal": slice(12, 24)}
+
+
+def file_version(database):
+    """State of a database file and of its -wal file
+
+    Each is (mtime_ns, size, header) or None if missing. In rollback
+    journal mode every commit bumps the file change counter in the
+    header; in WAL mode every commit grows the -wal file until a
+    checkpoint restarts it with new salts. So keys that include this stop
+    matching as soon as the data could have changed, in this or any other
+    process, even when two commits land within one mtime tick.
+    """
+    version = []
+    for suffix, field in _HEADER_FIELDS.items():
+        path = f"{database}{suffix}"
+        try:
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                header = f.read(field.stop)[field]
+        except (OSError, ValueError):
+            version.append(None)
+        else:
+            version.append((st.st_mtime_ns, st.st_size, header))
+    return tuple(version)
+
+
+class DiskCache:
+    """Second-level query cache in a local SQLite file
+
+    Values are pickled with the highest protocol and stored with an
+    expiry time. Only keys whose first item is a database file path (as
+    cache_query builds them) are stored, versioned by file_version() of
+    that file, so a write anywhere makes older entries unreachable; the
+    pruner reclaims them. Several processes can share one file (WAL mode).
+
+    Values are unpickled when read, so anyone who can write the cache file
+    can run code in every process that uses it. The file is created
+    readable and writable by its owner only; do not put it somewhere
+    other users can replace it.
+
+    Take the digest() of a key before running its query and store under
+    that same digest, so a result read before a concurrent write is never
+    filed under the post-write version.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES,
+                 max_entry_bytes=MAX_ENTRY_BYTES, ttl=TTL,
+                 prune_every=PRUNE_EVERY):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._stats = collections.Counter()
+        self._stats_lock = threading.Lock()
+        self._writes = 0
+        # Owner-only from the start; SQLite gives -wal and -shm the same mode
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key BLOB PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored REAL NOT NULL,
+                    expires REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_entries_stored ON entries (stored)"
+            )
+
+    def _connection(self):
+        # One connection per thread, in autocommit mode
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def digest(self, key):
+        """Versioned on-disk key for `key`
+
+        None, meaning "do not use the disk tier", when the key names no
+        database file (in-memory and temporary databases have path '') or
+        cannot be pickled. Unversioned keys would be shared by unrelated
+        databases in other processes.
+        """
+        if not (isinstance(key, tuple) and key and isinstance(key[0], str)
+                and key[0]):
+            return None
+        version = file_version(key[0])
+        if version[0] is None:
+            return None
+        try:
+            blob = pickle.dumps((version, key), pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return None
+        return hashlib.blake2b(blob, digest_size=16).digest()
+
+    def get(self, digest):
+        """Return the (value, tables) stored under `digest`, or None"""
+        row = self._connection().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires > ?",
+            (digest, time.time())
+        ).fetchone()
+        self._count("hits" if row else "misses")
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, digest, value, tables=(), ttl=None):
+        """Store `value` and the tables it read; returns whether it fit"""
+        try:
+            blob = pickle.dumps((value, set(tables)), pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return False
+        if len(blob) > min(self.max_entry_bytes, self.max_bytes):
+            self._count("rejected")
+            return False
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+            (digest, blob, len(blob), now, now + ttl)
+        )
+        self._count("writes")
+        with self._stats_lock:
+            self._writes += 1
+            due = self._writes % self.prune_every == 0
+        if due:
+            self.prune()
+        return True
+
+    def prune(self):
+        """Delete expired entries, then the oldest until under max_bytes"""
+        conn = self._connection()
+        expired = conn.execute(
+            "DELETE FROM entries WHERE expires <= ?", (time.time(),)
+        ).rowcount
+        (total,) = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        evicted = 0
+        while total > self.max_bytes:
+            rows = conn.execute(
+                "SELECT key, size FROM entries ORDER BY stored LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            conn.executemany(
+                "DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows]
+            )
+            total -= sum(size for _, size in rows)
+            evicted += len(rows)
+        self._count("expirations", expired)
+        self._count("evictions", evicted)
+
+    def clear(self):
+        self._connection().execute("DELETE FROM entries")
+
+    def stats(self):
+        """Hits, misses, writes, evictions, entries and bytes on disk"""
+        entries, size = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(entries=entries, bytes=size)
+        for key in ("hits", "misses", "writes", "rejected", "expirations",
+                    "evictions"):
+            stats.setdefault(key, 0)
+        return stats
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
@@ -0,0 +1,307 @@
+import collections
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+# Defaults for the shared users.db pool; override with configure()
+DB_PATH = 'users.db'
+MAX_SIZE = 5
+CHECKOUT_TIMEOUT = 5.0
+# Prepared statements sqlite3 keeps per connection
+STATEMENT_CACHE_SIZE = 256
+
+
+class PoolExhausted(sqlite3.OperationalError):
+    """No pooled connection became free within the checkout timeout"""
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its pool
+
+    It is a real sqlite3.Connection, so decorated functions and
+    isinstance() checks treat it like any other connection.
+    """
+
+    _pool = None
+    # Absolute path of the database file, used in cache keys
+    path = None
+    # Lent out by a shared pool; release() only takes it back once
+    checked_out = False
+
+    def query(self, sql, params=()):
+        """Execute `sql` on a new cursor and return the cursor
+
+        The prepared statement comes from sqlite3's per-connection
+        statement cache, so repeated SQL is only compiled once. Returning
+        the connection to the pool closes cursors still open, so a partly
+        read SELECT does not keep holding its read lock.
+        """
+        cursor = self.cursor()
+        self.__dict__.setdefault("_cursors", weakref.WeakSet()).add(cursor)
+        return cursor.execute(sql, params)
+
+    def close_cursors(self):
+        """Close the cursors query() returned that are still alive"""
+        for cursor in list(self.__dict__.pop("_cursors", ())):
+            cursor.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            super().close()
+
+    def discard(self):
+        """Really close the connection"""
+        self._pool = None
+        self.close_cursors()
+        super().close()
+
+
+class ConnectionPool:
+    """Pool of sqlite3 connections to one database
+
+    per_thread=True gives each thread its own long-lived connection;
+    nested checkouts on one thread share it, and only the outermost
+    release() rolls back. Otherwise up to `max_size` connections are
+    shared between threads and acquire() waits up to `timeout` seconds for
+    one; releasing a connection twice is harmless. Every new connection
+    runs the `pragmas` and keeps up to `cached_statements` prepared
+    statements; health_check=True pings reused connections first.
+    """
+
+    def __init__(self, database=DB_PATH, max_size=MAX_SIZE,
+                 timeout=CHECKOUT_TIMEOUT, per_thread=False, pragmas=(),
+                 health_check=True, cached_statements=STATEMENT_CACHE_SIZE):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.per_thread = per_thread
+        self.pragmas = pragmas
+        self.health_check = health_check
+        self.cached_statements = cached_statements
+        self._idle = collections.deque()
+        self._open = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._stats = collections.Counter()
+        self._stats_lock = threading.Lock()
+        self._wait_time = 0.0
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.database, factory=PooledConnection, check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name}={value}")
+        conn.path = conn.execute("PRAGMA database_list").fetchone()[2]
+        conn._pool = self
+        return conn
+
+    def acquire(self):
+        """Borrow a connection; close() on it gives it back"""
+        if self.per_thread:
+            return self._acquire_local()
+        start = time.perf_counter()
+        with self._cond:
+            waited = False
+            while not self._idle and self._open >= self.max_size:
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self._count("timeouts")
+                    raise PoolExhausted(
+                        f"No connection to {self.database} free within {self.timeout}s"
+                    )
+                self._cond.wait(remaining)
+            if waited:
+                self._count("waits", time.perf_counter() - start)
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._open += 1
+        if conn is not None:
+            if self._healthy(conn):
+                self._count("hits")
+                conn.checked_out = True
+                return conn
+            # Replace the dead connection in the slot it already holds
+            self._count("discarded")
+            self._close_quietly(conn)
+        self._count("misses")
+        try:
+            conn = self.connect()
+        except Exception:
+            self._release_slot()
+            raise
+        conn.checked_out = True
+        return conn
+
+    def release(self, conn):
+        """Return a connection, rolling back anything left uncommitted"""
+        if self.per_thread:
+            # Nested checkouts share the thread's connection; leave the
+            # outer holder's transaction alone until it is done too
+            self._local.depth = max(getattr(self._local, "depth", 1) - 1, 0)
+            if self._local.depth:
+                return
+        else:
+            with self._cond:
+                if not conn.checked_out:
+                    return
+                conn.checked_out = False
+        try:
+            # Reset partly read queries so they give up their read locks
+            conn.close_cursors()
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            if self.per_thread:
+                self._local.conn = None
+                conn.discard()
+            else:
+                self._discard(conn)
+            return
+        if self.per_thread:
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager around acquire()/release()"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def stats(self):
+        """Hit/miss counts, checkout waits and total wait time"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["wait_seconds"] = self._wait_time
+        with self._cond:
+            stats.update(open=self._open, idle=len(self._idle))
+        for key in ("hits", "misses", "waits", "timeouts", "discarded"):
+            stats.setdefault(key, 0)
+        return stats
+
+    def close(self):
+        """Close every idle connection"""
+        with self._cond:
+            idle, self._idle = list(self._idle), collections.deque()
+        for conn in idle:
+            self._discard(conn)
+
+    def _acquire_local(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "depth", 0):
+            self._local.depth += 1
+            self._count("hits")
+            return conn
+        if conn is not None:
+            if self._healthy(conn):
+                self._count("hits")
+                self._local.depth = 1
+                return conn
+            conn.discard()
+        self._count("misses")
+        conn = self._local.conn = self.connect()
+        self._local.depth = 1
+        return conn
+
+    def _count(self, key, wait_time=0.0):
+        with self._stats_lock:
+            self._stats[key] += 1
+            self._wait_time += wait_time
+
+    def _healthy(self, conn):
+        if not self.health_check:
+            return True
+        try:
+            conn.execute("PRAGMA schema_version").fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def _discard(self, conn):
+        self._count("discarded")
+        self._close_quietly(conn)
+        self._release_slot()
+
+    def _close_quietly(self, conn):
+        try:
+            conn.discard()
+        except sqlite3.Error:
+            pass
+
+    def _release_slot(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the module-wide users.db pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def configure(**kwargs):
+    """Replace the shared pool with one built from ConnectionPool kwargs"""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, ConnectionPool(**kwargs)
+    if old is not None:
+        old.close()
+    return _pool
+
+
+def benchmark(lookups=20000, query="SELECT * FROM users WHERE id = ?"):
+    """Single-row lookups per second: a connection per lookup, then pooled
+    connections without and with sqlite3's prepared statement cache"""
+    with get_pool().connection() as conn:
+        ids = [row[0] for row in conn.execute("SELECT id FROM users")]
+    keys = [(ids[i % len(ids)],) for i in range(lookups)]
+    uncached = ConnectionPool(max_size=1, cached_statements=0)
+
+    def connect_per_lookup(params):
+        conn = sqlite3.connect(uncached.database)
+        try:
+            return conn.cursor().execute(query, params).fetchone()
+        finally:
+            conn.close()
+
+    def pooled_no_statement_cache(params):
+        with uncached.connection() as conn:
+            return conn.cursor().execute(query, params).fetchone()
+
+    def pooled_statement_cache(params):
+        with get_pool().connection() as conn:
+            return conn.query(query, params).fetchone()
+
+    results = {}
+    for lookup in (connect_per_lookup, pooled_no_statement_cache,
+                   pooled_statement_cache):
+        start = time.perf_counter()
+        for params in keys:
+            lookup(params)
+        results[lookup.__name__] = lookups / (time.perf_counter() - start)
+    uncached.close()
+    return results
+
+
+if __name__ == "__main__":
+    for label, rate in benchmark().items():
+        print(f"{label:>25}: {rate:,.0f} lookups/s")
@@ -0,0 +1,197 @@
+import atexit
+import collections
+import logging
+import logging.handlers
+import math
+import queue
+import sys
+import threading
+import time
+
+import pool
+
+# Queries slower than this are logged at WARNING whatever the sample rate
+SLOW_MS = 100.0
+# Histogram buckets grow by 4%, so percentiles are within about 2%
+GROWTH = 1.04
+_PER_LOG = 1 / math.log(GROWTH)
+
+logger = logging.getLogger("queries")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+# Callers only put records on this queue; a listener thread formats and
+# writes them, so slow output never holds up a query
+_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_queue))
+_listener = None
+
+
+def configure_logging(*handlers):
+    """Send query log records to `handlers` (default: stdout)"""
+    global _listener
+    if not handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(
+            "[%(asctime)s] %(message)s", "%Y-%m-%d %H:%M:%S"
+        ))
+        handlers = (handler,)
+    if _listener is not None:
+        _listener.stop()
+    _listener = logging.handlers.QueueListener(_queue, *handlers)
+    _listener.start()
+    return _listener
+
+
+def _stop_listener():
+    # Flush whatever is still queued when the process exits
+    if _listener is not None:
+        _listener.stop()
+
+
+configure_logging()
+atexit.register(_stop_listener)
+
+
+class Histogram:
+    """Log-bucketed latency histogram for one statement"""
+
+    def __init__(self):
+        # Bucket index (log base GROWTH of nanoseconds) -> count
+        self.buckets = {}
+        self.count = 0
+        self.seconds = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.errors = 0
+
+    def add(self, seconds, rows=None, error=False, log=math.log):
+        bucket = int(log(seconds * 1e9 + 1.0) * _PER_LOG)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.seconds += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if rows:
+            self.rows += rows
+        if error:
+            self.errors += 1
+
+    def percentile(self, p):
+        """Approximate p-th percentile in seconds"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                # Geometric middle of the bucket, in seconds
+                return min(GROWTH ** (bucket + 0.5) / 1e9, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "rows": self.rows,
+            "errors": self.errors,
+            "mean_ms": 1000 * self.seconds / self.count if self.count else 0.0,
+            "p50_ms": 1000 * self.percentile(50),
+            "p95_ms": 1000 * self.percentile(95),
+            "p99_ms": 1000 * self.percentile(99),
+            "max_ms": 1000 * self.max,
+        }
+
+
+# Timings are appended here without a lock (deque.append is atomic) and
+# folded into the histograms by a background thread every DRAIN_INTERVAL
+# seconds, or when someone reads them
+DRAIN_INTERVAL = 1.0
+_pending = collections.deque()
+_histograms = collections.defaultdict(Histogram)
+_histograms_lock = threading.Lock()
+
+
+def record(query, seconds, rows=None, error=False):
+    """Note one execution of `query`; error=True if it raised"""
+    _pending.append((query, seconds, rows, error))
+
+
+def _drain():
+    with _histograms_lock:
+        while True:
+            try:
+                query, seconds, rows, error = _pending.popleft()
+            except IndexError:
+                return
+            _histograms[query].add(seconds, rows, error)
+
+
+def _drain_forever():
+    while True:
+        time.sleep(DRAIN_INTERVAL)
+        _drain()
+
+
+threading.Thread(
+    target=_drain_forever, name="query-log-drain", daemon=True
+).start()
+
+
+def stats():
+    """Per-statement count, rows, errors, mean, p50/p95/p99 and max time
+    in ms"""
+    _drain()
+    with _histograms_lock:
+        return {query: h.summary() for query, h in _histograms.items()}
+
+
+def reset():
+    """Forget every recorded timing"""
+    with _histograms_lock:
+        _pending.clear()
+        _histograms.clear()
+
+
+def benchmark(calls=1000, rounds=15, sample_rate=0.01,
+              query="SELECT * FROM users"):
+    """Overhead of @log_queries on a tight query loop
+
+    Runs the loop bare and decorated `rounds` times each, keeping the best
+    time of each so scheduler noise does not count as overhead.
+    """
+    log_queries = __import__('0-log_queries').log_queries
+    configure_logging(logging.NullHandler())
+
+    def lookup(query, conn):
+        return conn.execute(query).fetchall()
+
+    logged = log_queries(sample_rate=sample_rate)(lookup)
+    best = {}
+    with pool.get_pool().connection() as conn:
+        runs = [("bare", lookup), ("logged", logged)]
+        for _ in range(rounds):
+            # Alternate which goes first so warm-up effects cancel out
+            runs.reverse()
+            for label, fn in runs:
+                start = time.perf_counter()
+                for _ in range(calls):
+                    fn(query, conn)
+                elapsed = time.perf_counter() - start
+                best[label] = min(best.get(label, elapsed), elapsed)
+    configure_logging()
+    return {
+        "calls": calls,
+        "bare_us": 1e6 * best["bare"] / calls,
+        "logged_us": 1e6 * best["logged"] / calls,
+        "overhead_pct": 100 * (best["logged"] / best["bare"] - 1),
+    }
+
+
+if __name__ == "__main__":
+    # Let 0-log_queries share this copy of the module, logger and listener
+    sys.modules.setdefault("query_log", sys.modules[__name__])
+    result = benchmark()
+    print(f"{result['bare_us']:.2f} us/query bare, "
+          f"{result['logged_us']:.2f} us/query logged "
+          f"({result['overhead_pct']:+.1f}%)")
@@ -0,0 +1,131 @@
+import collections
+import random
+import sqlite3
+import threading
+import time
+
+import pool
+
+# Longest single back-off sleep, in seconds
+MAX_DELAY = 30.0
+# Consecutive failures that open a circuit, and how long it stays open
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+# OperationalError messages that mean "try again later", not "this is wrong"
+RETRYABLE_MESSAGES = (
+    "database is locked",
+    "database table is locked",
+    "database is busy",
+    "database schema has changed",
+)
+
+
+def is_retryable(exc):
+    """True for transient SQLite errors: lock contention and pool timeouts"""
+    if isinstance(exc, pool.PoolExhausted):
+        return True
+    if isinstance(exc, sqlite3.OperationalError):
+        message = str(exc).lower()
+        return any(text in message for text in RETRYABLE_MESSAGES)
+    return False
+
+
+def backoff(attempt, delay, max_delay=MAX_DELAY):
+    """Full-jitter sleep before retry number `attempt` (0-based)
+
+    Uniform between 0 and delay * 2**attempt, capped at max_delay, so
+    callers that failed together do not all retry together.
+    """
+    return random.uniform(0, min(max_delay, delay * 2 ** attempt))
+
+
+class CircuitOpen(Exception):
+    """The circuit breaker is open; the call was not attempted"""
+
+
+class CircuitBreaker:
+    """Fails calls fast after `failure_threshold` consecutive failures
+
+    Once open, calls raise CircuitOpen for `reset_timeout` seconds. After
+    that one trial call is let through: success closes the circuit again,
+    failure re-opens it for another `reset_timeout`, and a call ended by
+    ignored() lets the next call be the trial instead.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD,
+                 reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go ahead"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if (time.monotonic() - self._opened_at >= self.reset_timeout
+                    and not self._trial):
+                self._trial = True
+                return
+        raise CircuitOpen(
+            f"Circuit open after {self.failure_threshold} consecutive failures"
+        )
+
+    def succeeded(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failed(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    def ignored(self):
+        """A call ended in a way that says nothing about the database's
+        health, e.g. a constraint violation or cancellation"""
+        with self._lock:
+            self._trial = False
+
+
+# Function name -> counters; see stats()
+_stats = collections.defaultdict(collections.Counter)
+_stats_lock = threading.Lock()
+
+
+def count(name, **amounts):
+    with _stats_lock:
+        _stats[name].update(amounts)
+
+
+def stats():
+    """Per decorated function: calls, attempts, retries, failures, calls
+    rejected by an open circuit, and seconds spent sleeping between tries"""
+    keys = ("calls", "attempts", "retries", "failures", "rejected",
+            "retry_seconds")
+    with _stats_lock:
+        return {
+            name: {key: counter.get(key, 0) for key in keys}
+            for name, counter in _stats.items()
+        }
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
@@ -1,22 +1,18 @@
-import mysql.connector
-import os
+import backends
+import rows as row_types
 
-def stream_users():
-    """Generator to stream users one by one"""
-    conn = mysql.connector.connect(
-        host="localhost",
-        user=os.getenv('DB_USER', 'root'),
-        password=os.getenv('DB_PASSWORD', ''),
-        database="ALX_prodev"
-    )
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM user_data")
-    
-    while True:
-        row = cursor.fetchone()
-        if row is None:
-            break
-        yield row
-    
-    cursor.close()
-    conn.close()
+# Rows pulled from the server per fetchmany() call when streaming
+CHUNK_SIZE = 1000
+
+def stream_users(chunk_size=CHUNK_SIZE, row_factory=dict):
+    """Generator to stream users one by one
+
+    Uses a streaming cursor (unbuffered on MySQL) and pulls rows
+    `chunk_size` at a time, so memory stays flat however large user_data
+    is. row_factory=tuple or rows.UserRow avoids building a dict per row
+    (see rows.convert).
+    """
+    for rows in backends.stream_chunks(
+            f"SELECT {row_types.USER_SELECT} FROM user_data", (), chunk_size,
+            **row_types.cursor_options(row_factory)):
+        yield from row_types.convert(rows, row_factory)
@@ -1,27 +1,34 @@
-import mysql.connector
-import os
-
-def stream_users_in_batches(batch_size):
-    """Yield batches of users from the database"""
-    conn = mysql.connector.connect(
-        host="localhost",
-        user=os.getenv('DB_USER', 'root'),
-        password=os.getenv('DB_PASSWORD', ''),
-        database="ALX_prodev"
-    )
+import backends
+import columnar
+import rows as row_types
+import seed
+
+lazy_paginate = __import__('2-lazy_paginate').lazy_paginate
+
+def stream_users_in_batches(batch_size, keyset=False, sort_key="user_id", cursor=None,
+                            row_factory=dict):
+    """Yield batches of users from the database
+
+    keyset=True (or a resume `cursor`) seeks by `sort_key` instead of using
+    OFFSET, so late batches cost the same as early ones. row_factory picks
+    the row type, as for stream_users.
+    """
+    if keyset or cursor is not None:
+        yield from lazy_paginate(
+            batch_size, True, sort_key, cursor, row_factory=row_factory
+        )
+        return
+
     offset = 0
     
     while True:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT * FROM user_data LIMIT %s OFFSET %s",
-            (batch_size, offset)
-        )
-        batch = cursor.fetchall()
-        cursor.close()
+        batch = row_types.convert(backends.fetch_all(
+            f"SELECT {row_types.USER_SELECT} FROM user_data LIMIT %s OFFSET %s",
+            (batch_size, offset),
+            **row_types.cursor_options(row_factory)
+        ), row_factory)
         
         if not batch:
-            conn.close()
             return  # Explicit return when done
         
         yield batch
@@ -34,3 +41,21 @@ def batch_processing(batch_size):
             if user['age'] > 25:
                 print(user)
         return  # Added explicit return after processing
+
+def stream_column_batches(batch_size, columns=seed.USER_COLUMNS):
+    """Yield batches of users as columnar.RecordBatch objects"""
+    unknown = set(columns) - set(seed.USER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown user_data columns: {sorted(unknown)}")
+    query = f"SELECT {', '.join(columns)} FROM user_data"
+    for rows in backends.stream_chunks(query, (), batch_size):
+        yield columnar.RecordBatch.from_rows(columns, rows)
+
+def columnar_batch_processing(batch_size, *steps):
+    """Vectorised batch_processing: yield RecordBatches of users over age 25
+
+    Pass columnar.where()/columnar.select() steps to replace the default
+    age filter, e.g. columnar.where(lambda b: b["age"] > 40).
+    """
+    steps = steps or (columnar.where(lambda batch: batch["age"] > 25),)
+    return columnar.pipeline(stream_column_batches(batch_size), *steps)
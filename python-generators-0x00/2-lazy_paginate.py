@@ -1,30 +1,200 @@
-import mysql.connector
-import os
+import base64
+import json
+import backends
+import queue
+import rows as row_types
+import threading
+import time
 
-def paginate_users(page_size, offset):
+# Columns that can drive keyset pagination. Each one is indexed by
+# seed.create_table, which also adds missing indexes to older tables;
+# user_id breaks ties for the non-unique ones.
+SORT_KEYS = ("user_id", "age", "email")
+
+
+def paginate_users(page_size, offset, row_factory=dict):
     """Fetch a page of users from the database"""
-    conn = mysql.connector.connect(
-        host="localhost",
-        user=os.getenv('DB_USER', 'root'),
-        password=os.getenv('DB_PASSWORD', ''),
-        database="ALX_prodev"
+    return _fetch_page(
+        f"SELECT {row_types.USER_SELECT} FROM user_data LIMIT %s OFFSET %s",
+        (page_size, offset),
+        row_factory
     )
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute(
-        "SELECT * FROM user_data LIMIT %s OFFSET %s",
-        (page_size, offset)
+
+
+def _fetch_page(query, params, row_factory):
+    rows = backends.fetch_all(query, params, **row_types.cursor_options(row_factory))
+    return row_types.convert(rows, row_factory)
+
+
+def encode_cursor(row, sort_key="user_id"):
+    """Build an opaque resume token pointing just past `row`"""
+    state = [
+        sort_key,
+        str(row_types.value(row, sort_key)),
+        row_types.value(row, 'user_id'),
+    ]
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def decode_cursor(token):
+    """Return (sort_key, value, user_id) stored in a resume token"""
+    try:
+        sort_key, value, user_id = json.loads(base64.urlsafe_b64decode(token))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid pagination cursor: {token!r}") from e
+    if sort_key not in SORT_KEYS:
+        raise ValueError(f"Invalid pagination cursor: {token!r}")
+    return sort_key, value, user_id
+
+
+def keyset_query(page_size, cursor=None, sort_key="user_id"):
+    """Build the (sql, params) for the page that follows `cursor`"""
+    if sort_key not in SORT_KEYS:
+        raise ValueError(f"Unsupported sort key: {sort_key!r}")
+
+    where, params = "", ()
+    if cursor is not None:
+        cursor_key, value, user_id = decode_cursor(cursor)
+        if cursor_key != sort_key:
+            raise ValueError(
+                f"Cursor was issued for sort key {cursor_key!r}, not {sort_key!r}"
+            )
+        if sort_key == "user_id":
+            where, params = "WHERE user_id > %s", (user_id,)
+        else:
+            # Expanded form of (key, user_id) > (%s, %s) so older MySQL
+            # versions still turn it into an index range scan
+            where = f"WHERE {sort_key} > %s OR ({sort_key} = %s AND user_id > %s)"
+            params = (value, value, user_id)
+    order = "user_id" if sort_key == "user_id" else f"{sort_key}, user_id"
+    return (
+        f"SELECT {row_types.USER_SELECT} FROM user_data {where} "
+        f"ORDER BY {order} LIMIT %s",
+        params + (page_size,)
     )
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return rows
 
-def lazy_paginate(page_size):
-    """Generator for lazy loading paginated data"""
+
+def paginate_users_after(page_size, cursor=None, sort_key="user_id",
+                         row_factory=dict):
+    """Fetch the page of users that follows `cursor` in `sort_key` order"""
+    query, params = keyset_query(page_size, cursor, sort_key)
+    return _fetch_page(query, params, row_factory)
+
+
+def lazy_paginate(page_size, keyset=False, sort_key="user_id", cursor=None,
+                  prefetch=0, row_factory=dict):
+    """Generator for lazy loading paginated data
+
+    With keyset=True each page seeks past the last row of the previous one
+    instead of rescanning `offset` rows. Pass encode_cursor(page[-1]) from a
+    previous run as `cursor` to resume where it stopped. prefetch=K fetches
+    up to K pages ahead in a background thread while the caller works.
+    row_factory picks the row type, as for stream_users.
+    """
+    pages = _pages(page_size, keyset, sort_key, cursor, row_factory)
+    if prefetch:
+        pages = read_ahead(pages, prefetch)
+    yield from pages
+
+
+def _pages(page_size, keyset, sort_key, cursor, row_factory):
+    if keyset or cursor is not None:
+        while True:
+            page = paginate_users_after(page_size, cursor, sort_key, row_factory)
+            if not page:
+                break
+            yield page
+            cursor = encode_cursor(page[-1], sort_key)
+        return
+
     offset = 0
     while True:
-        page = paginate_users(page_size, offset)
+        page = paginate_users(page_size, offset, row_factory)
         if not page:
             break
         yield page
         offset += page_size
+
+
+_DONE = object()
+
+
+def read_ahead(items, depth):
+    """Iterate `items` in a background thread, up to `depth` items ahead
+
+    The bounded queue applies back-pressure: the reader stops fetching once
+    `depth` items are waiting. Closing this generator stops the reader after
+    its current fetch and closes `items`.
+    """
+    buffer = queue.Queue(depth)
+    stop = threading.Event()
+
+    def offer(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fill():
+        try:
+            for item in items:
+                if not offer((item, None)):
+                    return
+            offer((_DONE, None))
+        except Exception as e:
+            offer((_DONE, e))
+        finally:
+            items.close()
+
+    reader = threading.Thread(target=fill, name="read-ahead", daemon=True)
+    reader.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+        reader.join()
+
+
+def _timed(fetch, *args):
+    start = time.perf_counter()
+    page = fetch(*args)
+    return page, (time.perf_counter() - start) * 1000
+
+
+def benchmark_pagination(page_size=100, depths=(10_000, 1_000_000, 10_000_000)):
+    """Compare OFFSET and keyset latency for a page at each row depth
+
+    Seed user_data with at least max(depths) rows first; depths past the end
+    of the table are skipped.
+    """
+    results = []
+    for depth in depths:
+        page, offset_ms = _timed(paginate_users, page_size, depth)
+        if not page:
+            break
+        # The keyset page starts after the row just before `depth`
+        previous = backends.fetch_all(
+            "SELECT user_id FROM user_data ORDER BY user_id LIMIT 1 OFFSET %s",
+            (depth - 1,),
+            dictionary=True
+        )[0]
+        _, keyset_ms = _timed(
+            paginate_users_after, page_size, encode_cursor(previous)
+        )
+        results.append((depth, offset_ms, keyset_ms))
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'rows':>12} {'offset ms':>12} {'keyset ms':>12}")
+    for depth, offset_ms, keyset_ms in benchmark_pagination():
+        print(f"{depth:>12,} {offset_ms:>12.2f} {keyset_ms:>12.2f}")
@@ -1,25 +1,13 @@
-import mysql.connector
-import os
-
-def stream_user_ages():
-    """Generator for user ages"""
-    conn = mysql.connector.connect(
-        host="localhost",
-        user=os.getenv('DB_USER', 'root'),
-        password=os.getenv('DB_PASSWORD', ''),
-        database="ALX_prodev"
-    )
-    cursor = conn.cursor()
-    cursor.execute("SELECT age FROM user_data")
-    
-    while True:
-        row = cursor.fetchone()
-        if row is None:
-            break
-        yield row[0]
-    
-    cursor.close()
-    conn.close()
+import aggregates
+import backends
+
+stream = __import__('0-stream_users')
+
+def stream_user_ages(chunk_size=stream.CHUNK_SIZE):
+    """Generator for user ages, streamed `chunk_size` rows at a time"""
+    for rows in backends.stream_chunks("SELECT age FROM user_data", (), chunk_size):
+        for row in rows:
+            yield row[0]
 
 def calculate_average_age():
     """Calculate average age using generator"""
@@ -34,6 +22,48 @@ def calculate_average_age():
         return 0
     return total / count
 
+def age_stats(push_down=True, percentiles=(50, 95, 99)):
+    """Summarise user ages: count, sum, mean, min, max, variance, percentiles
+
+    push_down=True computes everything in SQL: one aggregate query plus
+    one ORDER BY age LIMIT 1 OFFSET n query per (nearest-rank) percentile.
+    Each walks n entries of the age index rather than seeking, so high
+    percentiles of large tables cost close to a full index scan.
+
+    push_down=False streams the ages once through aggregates.summarize(),
+    which estimates percentiles with a t-digest.
+    """
+    if not push_down:
+        return aggregates.summarize(stream_user_ages(), percentiles)
+
+    [(count, total, low, high, squares)] = backends.fetch_all(
+        "SELECT COUNT(age), SUM(age), MIN(age), MAX(age), SUM(age * age) "
+        "FROM user_data"
+    )
+    summary = {
+        "count": count, "sum": 0.0, "mean": None,
+        "min": None, "max": None, "variance": None,
+    }
+    if count:
+        # MySQL DECIMAL arithmetic keeps sum-of-squares variance exact
+        summary.update(
+            sum=float(total),
+            mean=float(total / count),
+            min=float(low),
+            max=float(high),
+            variance=float((squares - total * total / count) / count),
+        )
+    for p in percentiles:
+        value = None
+        if count:
+            [(value,)] = backends.fetch_all(
+                "SELECT age FROM user_data ORDER BY age LIMIT 1 OFFSET %s",
+                (aggregates.nearest_rank(count, p),)
+            )
+            value = float(value)
+        summary[f"p{p:g}"] = value
+    return summary
+
 if __name__ == "__main__":
     avg = calculate_average_age()
     print(f"Average age of users: {avg:.2f}")
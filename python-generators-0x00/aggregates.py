@@ -0,0 +1,144 @@
+import math
+
+
+class RunningStats:
+    """Single-pass count/sum/mean/min/max/variance (Welford's algorithm)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.min = None
+        self.max = None
+        self._m2 = 0.0
+
+    def add(self, value):
+        value = float(value)
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Fold in stats gathered over a disjoint part of the data"""
+        if not other.count:
+            return self
+        if not self.count:
+            self.__dict__.update(other.__dict__)
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """Population variance, matching SQL VAR_POP"""
+        return self._m2 / self.count if self.count else None
+
+
+class TDigest:
+    """Mergeable quantile sketch (merging t-digest)
+
+    Keeps at most a few times `compression` centroids, clustered tightly
+    near the tails so extreme percentiles stay accurate.
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.count = 0
+        self._centroids = []
+        self._buffer = []
+
+    def add(self, value, weight=1):
+        self._buffer.append((float(value), weight))
+        self.count += weight
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+
+    def merge(self, other):
+        """Fold in a digest built over a disjoint part of the data"""
+        other._compress()
+        self._buffer.extend(other._centroids)
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        merged = []
+        seen = 0
+        mean, weight = points[0]
+        for value, w in points[1:]:
+            q = (seen + (weight + w) / 2) / self.count
+            limit = max(1, 4 * self.count * q * (1 - q) / self.compression)
+            if weight + w <= limit:
+                weight += w
+                mean += (value - mean) * w / weight
+            else:
+                merged.append((mean, weight))
+                seen += weight
+                mean, weight = value, w
+        merged.append((mean, weight))
+        self._centroids = merged
+
+    def quantile(self, q):
+        """Estimate the value below which a fraction `q` of samples fall"""
+        self._compress()
+        centroids = self._centroids
+        if not centroids:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, (mean, weight) in enumerate(centroids):
+            if seen + weight / 2 >= target:
+                if i == 0:
+                    return mean
+                prev_mean, prev_weight = centroids[i - 1]
+                left = seen - prev_weight / 2
+                right = seen + weight / 2
+                return prev_mean + (mean - prev_mean) * (target - left) / (right - left)
+            seen += weight
+        return centroids[-1][0]
+
+
+def summarize(values, percentiles=(50, 95, 99)):
+    """Describe a stream of numbers in one pass with bounded memory"""
+    stats, digest = RunningStats(), TDigest()
+    for value in values:
+        stats.add(value)
+        digest.add(value)
+    return describe(stats, digest, percentiles)
+
+
+def describe(stats, digest, percentiles=(50, 95, 99)):
+    """Build the summary dict for accumulated stats and digest"""
+    summary = {
+        "count": stats.count,
+        "sum": stats.total,
+        "mean": stats.mean if stats.count else None,
+        "min": stats.min,
+        "max": stats.max,
+        "variance": stats.variance,
+    }
+    for p in percentiles:
+        summary[f"p{p:g}"] = digest.quantile(p / 100)
+    return summary
+
+
+def nearest_rank(count, percentile):
+    """Zero-based row offset of the nearest-rank percentile"""
+    return max(0, math.ceil(percentile / 100 * count) - 1)
@@ -0,0 +1,199 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiomysql
+except ImportError:  # only the asyncio API needs it
+    aiomysql = None
+
+import rows as row_types
+
+lazy = __import__('2-lazy_paginate')
+CHUNK_SIZE = __import__('0-stream_users').CHUNK_SIZE
+
+# Upper bound on streams reading at once; extra streams wait for a connection
+MAX_CONCURRENT_STREAMS = 10
+
+_pool = None
+_pool_loop = None
+
+
+async def get_pool():
+    """Return the aiomysql pool for the running event loop
+
+    The pool's maxsize is the concurrency limit: a stream holds one
+    connection while it reads, and further streams wait for one to free up.
+    """
+    global _pool, _pool_loop
+    if aiomysql is None:
+        raise ImportError("The asyncio streams require aiomysql")
+    loop = asyncio.get_running_loop()
+    if _pool is None or _pool_loop is not loop:
+        if _pool is not None:
+            _close_foreign(_pool)
+        # Store the creation task so concurrent first callers share one pool
+        _pool_loop = loop
+        _pool = asyncio.ensure_future(aiomysql.create_pool(
+            host="localhost",
+            user=os.getenv('DB_USER', 'root'),
+            password=os.getenv('DB_PASSWORD', ''),
+            db="ALX_prodev",
+            minsize=1,
+            maxsize=MAX_CONCURRENT_STREAMS,
+            autocommit=True,
+        ))
+    pool = _pool
+    try:
+        return await pool
+    except BaseException:
+        # Let the next caller retry instead of re-raising this failure
+        if _pool is pool and pool.done():
+            _pool = None
+        raise
+
+
+def _close_foreign(pool):
+    # A pool from an earlier event loop cannot be awaited on this one;
+    # close its idle connections rather than leave their sockets open
+    if not pool.done() or pool.cancelled() or pool.exception() is not None:
+        return
+    try:
+        pool.result().close()
+    except RuntimeError:
+        # Its loop is already closed and took the transports with it
+        pass
+
+
+async def close():
+    """Close the pool, e.g. before the event loop shuts down"""
+    global _pool, _pool_loop
+    pool, _pool, _pool_loop = _pool, None, None
+    if pool is None:
+        return
+    if pool.get_loop() is not asyncio.get_running_loop():
+        _close_foreign(pool)
+        return
+    try:
+        pool = await pool
+    except Exception:
+        return
+    pool.close()
+    await pool.wait_closed()
+
+
+async def _stream(query, params=(), chunk_size=CHUNK_SIZE,
+                  cursor_class="SSDictCursor"):
+    # Server-side cursor read in chunks. A stream abandoned part-way closes
+    # its connection, which is cheaper than draining the rest of the result.
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        try:
+            cursor = await conn.cursor(getattr(aiomysql, cursor_class))
+            await cursor.execute(query, params)
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+            await cursor.close()
+        except BaseException:
+            conn.close()
+            raise
+
+
+async def stream_users(chunk_size=CHUNK_SIZE):
+    """Async generator to stream users one by one"""
+    query = f"SELECT {row_types.USER_SELECT} FROM user_data"
+    async for row in _stream(query, (), chunk_size):
+        yield row
+
+
+async def stream_user_ages(chunk_size=CHUNK_SIZE):
+    """Async generator for user ages"""
+    query = "SELECT age FROM user_data"
+    async for row in _stream(query, (), chunk_size, "SSCursor"):
+        yield row[0]
+
+
+async def _fetch_page(query, params):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+
+
+async def paginate_users(page_size, offset):
+    """Fetch a page of users from the database"""
+    return await _fetch_page(
+        f"SELECT {row_types.USER_SELECT} FROM user_data LIMIT %s OFFSET %s",
+        (page_size, offset)
+    )
+
+
+async def lazy_paginate(page_size, keyset=False, sort_key="user_id", cursor=None):
+    """Async generator for lazy loading paginated data (see lazy_paginate)"""
+    if keyset or cursor is not None:
+        while True:
+            page = await _fetch_page(*lazy.keyset_query(page_size, cursor, sort_key))
+            if not page:
+                break
+            yield page
+            cursor = lazy.encode_cursor(page[-1], sort_key)
+        return
+
+    offset = 0
+    while True:
+        page = await paginate_users(page_size, offset)
+        if not page:
+            break
+        yield page
+        offset += page_size
+
+
+async def stream_users_in_batches(batch_size, keyset=True, sort_key="user_id",
+                                  cursor=None):
+    """Async generator of user batches; keyset paginated by default"""
+    async for page in lazy_paginate(batch_size, keyset, sort_key, cursor):
+        yield page
+
+
+async def calculate_average_age():
+    """Calculate average age using the async age stream"""
+    total = 0
+    count = 0
+    async for age in stream_user_ages():
+        total += age
+        count += 1
+    return total / count if count else 0
+
+
+async def _count_async(streams):
+    async def drain():
+        return sum([1 async for _ in stream_users()])
+    return sum(await asyncio.gather(*(drain() for _ in range(streams))))
+
+
+def benchmark(streams=8):
+    """Rows/sec for `streams` concurrent full scans: asyncio vs threads"""
+    stream = __import__('0-stream_users')
+
+    start = time.perf_counter()
+    rows = asyncio.run(_count_async(streams))
+    async_rate = rows / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(streams) as executor:
+        rows = sum(executor.map(
+            lambda _: sum(1 for _ in stream.stream_users()), range(streams)
+        ))
+    thread_rate = rows / (time.perf_counter() - start)
+    return {"async_rows_per_sec": async_rate, "threaded_rows_per_sec": thread_rate}
+
+
+if __name__ == "__main__":
+    for label, rate in benchmark().items():
+        print(f"{label}: {rate:,.0f}")
@@ -0,0 +1,232 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+import pool
+
+try:
+    import mysql.connector
+except ImportError:  # the SQLite and memory backends run without it
+    mysql = None
+
+# SQLite cannot bind Decimal natively; store ages as exact text instead
+sqlite3.register_adapter(Decimal, str)
+
+SQLITE_PATH = "ALX_prodev.sqlite3"
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -64_000),
+    ("mmap_size", 256 * 2**20),
+    ("temp_store", "MEMORY"),
+)
+
+
+class MySQLBackend:
+    """user_data on the ALX_prodev MySQL server, through the shared pool"""
+
+    name = "mysql"
+    now_minus_seconds = "NOW(6) - INTERVAL %s SECOND"
+
+    def __init__(self):
+        if mysql is None:
+            raise ImportError("The mysql backend requires mysql-connector-python")
+
+    def connection(self):
+        return pool.connection()
+
+    def sql(self, query):
+        return query
+
+    def cursor(self, conn, dictionary=False, stream=False):
+        """stream=True leaves rows on the server until they are fetched"""
+        if stream:
+            return conn.cursor(dictionary=dictionary, buffered=False)
+        return conn.cursor(dictionary=dictionary)
+
+    def close_cursor(self, cursor):
+        try:
+            cursor.close()
+        except mysql.connector.Error:
+            # Unread rows are still pending; the pool discards such connections
+            pass
+
+    def create_user_table(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_data (
+                user_id VARCHAR(36) PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                email VARCHAR(255) NOT NULL,
+                age DECIMAL(10,2) NOT NULL,
+                updated_at TIMESTAMP(6) NOT NULL
+                    DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                INDEX idx_user_data_age (age),
+                INDEX idx_user_data_email (email),
+                INDEX idx_user_data_updated_at (updated_at, user_id)
+            )
+        """)
+        cursor.close()
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteBackend:
+    """user_data in a local SQLite file
+
+    Each thread gets its own connection, tuned with `pragmas` (WAL,
+    memory-mapped reads, a large page cache). Streaming uses plain
+    fetchmany() on the cursor, which SQLite steps lazily.
+    """
+
+    name = "sqlite"
+    now_minus_seconds = (
+        "strftime('%Y-%m-%d %H:%M:%f', 'now', '-' || %s || ' seconds')"
+    )
+
+    def __init__(self, path=SQLITE_PATH, pragmas=SQLITE_PRAGMAS):
+        self.path = path
+        self.pragmas = pragmas
+        self._local = threading.local()
+
+    def connect(self):
+        # Generators may be resumed on another thread than the one that
+        # started them, so connections are not pinned to their creator
+        conn = sqlite3.connect(
+            self.path, check_same_thread=False, uri=self.path.startswith("file:")
+        )
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+        yield conn
+
+    def sql(self, query):
+        return query.replace("%s", "?").replace("INSERT IGNORE", "INSERT OR IGNORE")
+
+    def cursor(self, conn, dictionary=False, stream=False):
+        cursor = conn.cursor()
+        if dictionary:
+            cursor.row_factory = _dict_row
+        return cursor
+
+    def close_cursor(self, cursor):
+        cursor.close()
+
+    def create_user_table(self, conn):
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS user_data (
+                user_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                email TEXT NOT NULL,
+                age NUMERIC NOT NULL,
+                updated_at TEXT NOT NULL
+                    DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+            );
+            CREATE INDEX IF NOT EXISTS idx_user_data_age ON user_data (age);
+            CREATE INDEX IF NOT EXISTS idx_user_data_email ON user_data (email);
+            CREATE INDEX IF NOT EXISTS idx_user_data_updated_at
+                ON user_data (updated_at, user_id);
+            CREATE TRIGGER IF NOT EXISTS user_data_touch
+            AFTER UPDATE ON user_data
+            WHEN NEW.updated_at = OLD.updated_at
+            BEGIN
+                UPDATE user_data
+                SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+                WHERE user_id = NEW.user_id;
+            END;
+        """)
+
+
+class MemoryBackend(SQLiteBackend):
+    """user_data in a process-local in-memory SQLite database
+
+    All threads share one database via SQLite's shared cache; it lives as
+    long as the backend object keeps its anchor connection open.
+    """
+
+    name = "memory"
+
+    def __init__(self, database="user_data", pragmas=(("temp_store", "MEMORY"),)):
+        super().__init__(f"file:{database}?mode=memory&cache=shared", pragmas)
+        self._anchor = self.connect()
+
+
+BACKENDS = {
+    "mysql": MySQLBackend,
+    "sqlite": SQLiteBackend,
+    "memory": MemoryBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create(name, **kwargs):
+    """Build a backend by name: mysql, sqlite or memory"""
+    try:
+        return BACKENDS[name](**kwargs)
+    except KeyError:
+        raise ValueError(
+            f"Unknown backend {name!r}; use one of {sorted(BACKENDS)}"
+        ) from None
+
+
+def get_backend():
+    """Return the active backend, chosen by $USER_DATA_BACKEND (default mysql)"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.getenv('USER_DATA_BACKEND', 'mysql')
+            kwargs = {}
+            if name == "sqlite":
+                kwargs["path"] = os.getenv('USER_DATA_SQLITE', SQLITE_PATH)
+            _backend = create(name, **kwargs)
+        return _backend
+
+
+def set_backend(backend, **kwargs):
+    """Make `backend` (an instance or a name) the one every stream uses"""
+    global _backend
+    if isinstance(backend, str):
+        backend = create(backend, **kwargs)
+    with _backend_lock:
+        _backend = backend
+    return backend
+
+
+def stream_chunks(query, params=(), chunk_size=1000, dictionary=False):
+    """Run a query on the active backend, yielding rows chunk_size at a time"""
+    backend = get_backend()
+    with backend.connection() as conn:
+        cursor = backend.cursor(conn, dictionary, stream=True)
+        try:
+            cursor.execute(backend.sql(query), params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            backend.close_cursor(cursor)
+
+
+def fetch_all(query, params=(), dictionary=False):
+    """Run a query on the active backend and return every row"""
+    backend = get_backend()
+    with backend.connection() as conn:
+        cursor = backend.cursor(conn, dictionary)
+        try:
+            cursor.execute(backend.sql(query), params)
+            return cursor.fetchall()
+        finally:
+            backend.close_cursor(cursor)
@@ -0,0 +1,168 @@
+"""Benchmark suite for the user_data generators
+
+Seeds synthetic user_data of a given size on each backend, then measures
+every workload: time to first row, rows/sec, peak Python memory and
+database round trips (execute and fetch calls). Results are JSON so runs
+can be diffed between releases:
+
+    python benchmark.py --rows 1000000 --backends sqlite mysql -o bench.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import backends
+import seed
+
+stream = __import__('0-stream_users')
+processing = __import__('1-batch_processing')
+lazy = __import__('2-lazy_paginate')
+ages = __import__('4-stream_ages')
+
+ROWS = 100_000
+PAGE_SIZE = 1000
+
+# Workload name -> (callable returning an iterator, rows per item). Rows
+# per item of None means one result summarising the whole table.
+WORKLOADS = {
+    "stream_users": (stream.stream_users, lambda row: 1),
+    "stream_users_in_batches": (
+        lambda: processing.stream_users_in_batches(PAGE_SIZE), len
+    ),
+    "lazy_paginate": (lambda: lazy.lazy_paginate(PAGE_SIZE), len),
+    "lazy_paginate_keyset": (
+        lambda: lazy.lazy_paginate(PAGE_SIZE, keyset=True), len
+    ),
+    "calculate_average_age": (
+        lambda: iter([ages.calculate_average_age()]), None
+    ),
+}
+
+
+class CountingCursor:
+    """Cursor proxy that counts calls which go to the database"""
+
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name.startswith(("execute", "fetch")):
+            def counted(*args, **kwargs):
+                self._counter[0] += 1
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+class CountingBackend:
+    """Wraps a backend so every cursor it hands out is a CountingCursor"""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self.round_trips = [0]
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+    def cursor(self, conn, dictionary=False, stream=False):
+        return CountingCursor(
+            self._backend.cursor(conn, dictionary, stream), self.round_trips
+        )
+
+
+def prepare(backend, rows=ROWS):
+    """Make `backend` active and top its user_data up to `rows` rows"""
+    backends.set_backend(backend)
+    with backend.connection() as conn:
+        seed.create_table(conn)
+        [(count,)] = backends.fetch_all("SELECT COUNT(*) FROM user_data")
+        if count < rows:
+            # Synthetic rows are deterministic, so existing ones are ignored
+            seed.insert_rows(conn, seed.synthetic_rows(rows))
+        [(count,)] = backends.fetch_all("SELECT COUNT(*) FROM user_data")
+    return count
+
+
+def measure(workload, table_rows, backend):
+    """Run one workload twice: once timed, once under tracemalloc"""
+    start_iter, rows_of = workload
+    counting = backends.set_backend(CountingBackend(backend))
+    try:
+        rows = 0
+        first = None
+        start = time.perf_counter()
+        for item in start_iter():
+            if first is None:
+                first = time.perf_counter() - start
+            rows += rows_of(item) if rows_of else table_rows
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        for _ in start_iter():
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        backends.set_backend(backend)
+
+    return {
+        "rows": rows,
+        "seconds": elapsed,
+        "time_to_first_row_ms": 1000 * (first if first is not None else elapsed),
+        "rows_per_sec": rows / elapsed if elapsed else None,
+        # Both runs do the same calls, so halve the combined count
+        "round_trips": counting.round_trips[0] // 2,
+        "peak_python_mb": peak / 2**20,
+    }
+
+
+def run(names=("memory", "sqlite"), rows=ROWS, workloads=WORKLOADS):
+    """Benchmark every workload on every backend; returns a JSON-able dict"""
+    report = {
+        "meta": {
+            "rows": rows,
+            "page_size": PAGE_SIZE,
+            "chunk_size": stream.CHUNK_SIZE,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": {},
+    }
+    for name in names:
+        backend = backends.create(name)
+        table_rows = prepare(backend, rows)
+        report["results"][name] = {
+            label: measure(workload, table_rows, backend)
+            for label, workload in workloads.items()
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=ROWS)
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"],
+                        choices=sorted(backends.BACKENDS))
+    parser.add_argument("--workloads", nargs="+", default=list(WORKLOADS),
+                        choices=list(WORKLOADS))
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.backends, args.rows,
+                 {label: WORKLOADS[label] for label in args.workloads})
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import sqlite3
+import time
+
+processing = __import__('1-batch_processing')
+lazy = __import__('2-lazy_paginate')
+
+# Local SQLite file holding one checkpoint row per job
+CHECKPOINT_DB = "batch_checkpoints.sqlite3"
+
+
+class CheckpointStore:
+    """Last committed batch boundary per job, kept in a SQLite table"""
+
+    def __init__(self, path=CHECKPOINT_DB):
+        # Autocommit mode: transactions are opened explicitly below
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                job TEXT PRIMARY KEY,
+                cursor TEXT,
+                batches INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def load(self, job):
+        """Return (cursor, batches, rows) for `job`; (None, 0, 0) if new"""
+        row = self.conn.execute(
+            "SELECT cursor, batches, rows FROM checkpoints WHERE job = ?", (job,)
+        ).fetchone()
+        return row or (None, 0, 0)
+
+    def save(self, job, cursor, batches, rows):
+        """Record a batch boundary; call inside the batch's transaction"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+            (job, cursor, batches, rows, time.time())
+        )
+
+    def reset(self, job):
+        """Forget a job's progress so the next run starts from the top"""
+        self.conn.execute("DELETE FROM checkpoints WHERE job = ?", (job,))
+
+    def close(self):
+        self.conn.close()
+
+
+def run_batches(process, batch_size, job="batch_processing", store=None,
+                exactly_once=False, sort_key="user_id"):
+    """Run process() over every batch of users, resuming after a crash
+
+    Batches are keyset-paginated, so a checkpoint is just the cursor of the
+    last committed batch and resuming never rescans earlier rows.
+
+    By default the semantics are at-least-once: process(batch) runs, then
+    the checkpoint is committed, so a crash in between re-runs that one
+    batch. With exactly_once=True, process(batch, conn) receives the
+    checkpoint database connection inside an open transaction; anything it
+    writes through `conn` commits atomically with the checkpoint, so each
+    batch's effects land exactly once. Returns (batches, rows) processed in
+    total for the job.
+    """
+    owns_store = store is None
+    store = store or CheckpointStore()
+    try:
+        cursor, done, rows = store.load(job)
+        for batch in processing.stream_users_in_batches(
+                batch_size, keyset=True, sort_key=sort_key, cursor=cursor):
+            cursor = lazy.encode_cursor(batch[-1], sort_key)
+            if exactly_once:
+                store.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    process(batch, store.conn)
+                    store.save(job, cursor, done + 1, rows + len(batch))
+                except BaseException:
+                    store.conn.execute("ROLLBACK")
+                    raise
+                store.conn.execute("COMMIT")
+            else:
+                process(batch)
+                store.save(job, cursor, done + 1, rows + len(batch))
+            done += 1
+            rows += len(batch)
+        return done, rows
+    finally:
+        if owns_store:
+            store.close()
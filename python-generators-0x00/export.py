@@ -0,0 +1,143 @@
+import csv
+import gzip
+import itertools
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Parquet/Arrow output is optional; CSV needs nothing
+    pa = None
+
+import seed
+
+stream = __import__('0-stream_users')
+
+# Rows per Parquet row group / Arrow record batch
+ROW_GROUP_SIZE = 100_000
+FORMATS = ("parquet", "arrow", "csv.gz")
+
+
+def _schema():
+    return pa.schema([
+        ("user_id", pa.string()),
+        ("name", pa.string()),
+        ("email", pa.string()),
+        ("age", pa.decimal128(10, 2)),
+    ])
+
+
+def _chunks(rows, size):
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def to_record_batch(chunk, schema):
+    """Transpose a list of row tuples into an Arrow record batch"""
+    columns = list(zip(*chunk))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def _write_arrow(path, fmt, chunks):
+    schema = _schema()
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(path, schema, compression="snappy")
+    else:
+        writer = pa.ipc.new_file(path, schema)
+    rows = 0
+    with writer:
+        for chunk in chunks:
+            batch = to_record_batch(chunk, schema)
+            if fmt == "parquet":
+                writer.write_batch(batch, row_group_size=len(chunk))
+            else:
+                writer.write_batch(batch)
+            rows += len(chunk)
+    return rows
+
+
+def _write_csv(path, chunks):
+    rows = 0
+    with gzip.open(path, "wt", newline="", compresslevel=6) as f:
+        writer = csv.writer(f)
+        writer.writerow(seed.USER_COLUMNS)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+
+def export_users(path, fmt=None, row_group_size=ROW_GROUP_SIZE,
+                 chunk_size=stream.CHUNK_SIZE):
+    """Stream user_data into a Parquet, Arrow IPC or gzip CSV file
+
+    Rows are read with stream_users() and written one row group at a time,
+    so memory is bounded by `row_group_size` rows rather than the table.
+    The format defaults to the file extension. Returns the rows written.
+    """
+    fmt = fmt or next((f for f in FORMATS if str(path).endswith("." + f)), None)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt!r}; use one of {FORMATS}")
+    rows = stream.stream_users(chunk_size, row_factory=tuple)
+    chunks = _chunks(rows, row_group_size)
+    try:
+        if fmt == "csv.gz":
+            return _write_csv(path, chunks)
+        if pa is None:
+            raise ImportError(f"Exporting to {fmt} requires pyarrow")
+        return _write_arrow(path, fmt, chunks)
+    finally:
+        rows.close()
+
+
+def _measure(fmt, row_group_size):
+    # Runs in a fresh process, so ru_maxrss is this export's own peak
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        rows = export_users(f"{directory}/user_data.{fmt}", fmt, row_group_size)
+        elapsed = time.perf_counter() - start
+    # KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    return rows, elapsed, peak_mb
+
+
+def benchmark(row_group_size=ROW_GROUP_SIZE):
+    """Rows/sec and peak RSS for exporting user_data to each format
+
+    ru_maxrss only ever grows, so each format is exported in its own forked
+    process; the peak includes the memory the process started with.
+    """
+    context = multiprocessing.get_context("fork")
+    results = {}
+    for fmt in FORMATS:
+        if fmt != "csv.gz" and pa is None:
+            continue
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            rows, elapsed, peak_mb = executor.submit(
+                _measure, fmt, row_group_size
+            ).result()
+        results[fmt] = {
+            "rows": rows,
+            "rows_per_sec": rows / elapsed if elapsed else 0,
+            "peak_rss_mb": peak_mb,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    for fmt, stats in benchmark().items():
+        print(f"{fmt:>8}: {stats['rows']:,} rows, {stats['rows_per_sec']:,.0f} rows/sec, "
+              f"peak RSS {stats['peak_rss_mb']:.0f} MB")
@@ -0,0 +1,163 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import aggregates
+import backends
+import seed
+
+CHUNK_SIZE = __import__('0-stream_users').CHUNK_SIZE
+
+# Default number of user_id ranges, and chunks buffered per range
+PARTITIONS = 8
+QUEUE_DEPTH = 4
+
+
+def split_ranges(partitions=PARTITIONS):
+    """Split user_data into contiguous user_id ranges of similar size
+
+    Returns (low, high) pairs; low is exclusive, high inclusive, and None
+    means unbounded. Each boundary is read with LIMIT 1 OFFSET n, which
+    walks n entries of the primary key index (but no table rows), so
+    splitting costs a few passes over the index.
+    """
+    [(count,)] = backends.fetch_all("SELECT COUNT(*) FROM user_data")
+    n = min(partitions, count)
+    bounds = []
+    for i in range(1, n):
+        [(bound,)] = backends.fetch_all(
+            "SELECT user_id FROM user_data ORDER BY user_id LIMIT 1 OFFSET %s",
+            (i * count // n - 1,)
+        )
+        # Rows deleted between queries can repeat a boundary
+        if not bounds or bound > bounds[-1]:
+            bounds.append(bound)
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def scan_range(low, high, columns=seed.USER_COLUMNS, chunk_size=CHUNK_SIZE):
+    """Stream the rows of one user_id range in key order as dicts"""
+    unknown = set(columns) - set(seed.USER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown user_data columns: {sorted(unknown)}")
+    where, params = [], []
+    if low is not None:
+        where.append("user_id > %s")
+        params.append(low)
+    if high is not None:
+        where.append("user_id <= %s")
+        params.append(high)
+    query = f"SELECT {', '.join(columns)} FROM user_data"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+
+    for rows in backends.stream_chunks(
+            query + " ORDER BY user_id", tuple(params), chunk_size, dictionary=True):
+        yield from rows
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+_DONE = object()
+
+
+def _produce(rows, out, stop, chunk_size):
+    # Runs in a worker: push chunks of rows until done or cancelled
+    try:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                if not _put(out, chunk, stop):
+                    return
+                chunk = []
+        if chunk and not _put(out, chunk, stop):
+            return
+        _put(out, _DONE, stop)
+    except Exception as e:
+        _put(out, _Failed(e), stop)
+    finally:
+        rows.close()
+
+
+def _put(out, item, stop):
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _drain(out, producers):
+    while producers:
+        item = out.get()
+        if item is _DONE:
+            producers -= 1
+        elif isinstance(item, _Failed):
+            raise item.error
+        else:
+            yield from item
+
+
+def scan_partitions(columns=seed.USER_COLUMNS, partitions=PARTITIONS,
+                    workers=None, ordered=False, chunk_size=CHUNK_SIZE):
+    """Stream user_data by reading its key ranges concurrently
+
+    Each range is read by a worker thread on its own connection.
+    ordered=True yields rows in user_id order (ranges are buffered up to
+    QUEUE_DEPTH chunks ahead of the consumer); ordered=False yields chunks
+    as soon as any worker has them. Closing the generator cancels workers.
+    """
+    ranges = split_ranges(partitions)
+    if ordered:
+        queues = [queue.Queue(QUEUE_DEPTH) for _ in ranges]
+    else:
+        queues = [queue.Queue(QUEUE_DEPTH * len(ranges))] * len(ranges)
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(workers or len(ranges))
+    try:
+        for (low, high), out in zip(ranges, queues):
+            executor.submit(
+                _produce, scan_range(low, high, columns, chunk_size),
+                out, stop, chunk_size
+            )
+        if ordered:
+            for out in queues:
+                yield from _drain(out, 1)
+        else:
+            yield from _drain(queues[0], len(ranges))
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def map_partitions(func, columns=seed.USER_COLUMNS, partitions=PARTITIONS,
+                   workers=None):
+    """Run func(rows) over every key range concurrently; return the results"""
+    ranges = split_ranges(partitions)
+    with ThreadPoolExecutor(workers or len(ranges)) as executor:
+        futures = [
+            executor.submit(func, scan_range(low, high, columns))
+            for low, high in ranges
+        ]
+        return [future.result() for future in futures]
+
+
+def _age_stats(rows):
+    stats = aggregates.RunningStats()
+    for row in rows:
+        stats.add(row['age'])
+    return stats
+
+
+def parallel_average_age(partitions=PARTITIONS, workers=None):
+    """calculate_average_age over concurrent range scans"""
+    total = aggregates.RunningStats()
+    for stats in map_partitions(_age_stats, ("age",), partitions, workers):
+        total.merge(stats)
+    return total.mean if total.count else 0
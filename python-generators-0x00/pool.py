@@ -0,0 +1,220 @@
+import collections
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import mysql.connector
+    from mysql.connector.errors import PoolError
+except ImportError:  # only the MySQL backend needs the driver
+    mysql = None
+    PoolError = None
+
+# Defaults for the shared ALX_prodev pool; override with configure()
+POOL_SIZE = 5
+MAX_OVERFLOW = 10
+IDLE_TIMEOUT = 300
+CHECKOUT_TIMEOUT = 30
+
+
+def connect_prodev(**kwargs):
+    """Open a new, unpooled connection to ALX_prodev"""
+    return mysql.connector.connect(
+        host="localhost",
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD', ''),
+        database="ALX_prodev",
+        **kwargs
+    )
+
+
+class PooledConnection:
+    """Proxy for a pooled connection; close() hands it back to the pool"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise PoolError("Connection was returned to the pool")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.checkin(conn)
+
+
+class ConnectionPool:
+    """Thread-safe pool of database connections
+
+    Keeps up to `size` idle connections and opens up to `max_overflow` extra
+    ones under load, which are closed rather than kept when returned. Idle
+    connections older than `idle_timeout` seconds are dropped, and every
+    checkout is health-checked so callers never get a dead socket.
+    """
+
+    def __init__(self, factory=connect_prodev, size=POOL_SIZE,
+                 max_overflow=MAX_OVERFLOW, idle_timeout=IDLE_TIMEOUT,
+                 timeout=CHECKOUT_TIMEOUT, health_check=None):
+        if mysql is None:
+            raise ImportError("The MySQL pool requires mysql-connector-python")
+        self.factory = factory
+        self.size = size
+        self.max_overflow = max_overflow
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.health_check = health_check or (lambda conn: conn.is_connected())
+        self._idle = collections.deque()
+        self._open = 0
+        self._cond = threading.Condition()
+
+    def checkout(self):
+        """Borrow a connection, waiting up to `timeout` seconds for one"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, stale = self._reserve(deadline)
+            for old in stale:
+                self._close(old)
+            if conn is None:
+                try:
+                    conn = self.factory()
+                except Exception:
+                    self._release_slot()
+                    raise
+                return PooledConnection(self, conn)
+            if self._healthy(conn):
+                return PooledConnection(self, conn)
+            self._close(conn)
+
+    def checkin(self, conn):
+        """Return a connection; dirty or surplus ones are closed"""
+        try:
+            reusable = conn.is_connected() and not conn.unread_result
+            if reusable and conn.in_transaction:
+                conn.rollback()
+        except mysql.connector.Error:
+            reusable = False
+        with self._cond:
+            if reusable and len(self._idle) < self.size:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and back in"""
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        """Close every idle connection"""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self._close(conn)
+
+    def _reserve(self, deadline):
+        # Returns (idle connection or None to open a new one, expired idles)
+        stale = []
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    conn, returned = self._idle.pop()
+                    if now - returned <= self.idle_timeout:
+                        return conn, stale
+                    stale.append(conn)
+                if self._open - len(stale) < self.size + self.max_overflow:
+                    self._open += 1
+                    return None, stale
+                remaining = deadline - now
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle:
+                        raise PoolError(
+                            f"No connection available within {self.timeout}s"
+                        )
+
+    def _healthy(self, conn):
+        try:
+            return self.health_check(conn)
+        except mysql.connector.Error:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the module-wide ALX_prodev pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def configure(**kwargs):
+    """Replace the shared pool with one built from ConnectionPool kwargs"""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, ConnectionPool(**kwargs)
+    if old is not None:
+        old.close()
+    return _pool
+
+
+def connection():
+    """Borrow a connection from the shared pool as a context manager"""
+    return get_pool().connection()
+
+
+def benchmark(page_size=100, pages=200):
+    """Mean lazy_paginate page latency in ms, pooled vs a connection per page"""
+    lazy_paginate = __import__('2-lazy_paginate').lazy_paginate
+    results = {}
+    for label, size in (("pooled", POOL_SIZE), ("unpooled", 0)):
+        # A pool that keeps no idle connections reconnects on every page
+        configure(size=size)
+        latencies = []
+        start = time.perf_counter()
+        for page in lazy_paginate(page_size, keyset=True):
+            now = time.perf_counter()
+            latencies.append(now - start)
+            if len(latencies) == pages:
+                break
+            start = now
+        results[label] = 1000 * sum(latencies) / max(len(latencies), 1)
+    configure()
+    return results
+
+
+if __name__ == "__main__":
+    for label, ms in benchmark().items():
+        print(f"{label:>9}: {ms:.2f} ms/page")
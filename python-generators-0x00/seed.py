@@ -1,9 +1,27 @@
-import mysql.connector
+import backends
 import csv
 import os
+import pool
+import random
+import time
+import uuid
+
+try:
+    import mysql.connector
+except ImportError:  # only needed to seed the MySQL backend
+    mysql = None
+
+# Rows per multi-row INSERT and rows between commits when seeding
+BATCH_SIZE = 5000
+COMMIT_EVERY = 100_000
+USER_COLUMNS = ("user_id", "name", "email", "age")
+# Secondary indexes behind keyset pagination on age and email
+SORT_INDEXES = (("idx_user_data_age", "age"), ("idx_user_data_email", "email"))
 
 def connect_db():
     """Connect to MySQL server"""
+    if mysql is None:
+        raise ImportError("Seeding MySQL requires mysql-connector-python")
     return mysql.connector.connect(
         host="localhost",
         user=os.getenv('DB_USER', 'root'),
@@ -16,37 +34,167 @@ def create_database(connection):
     cursor.execute("CREATE DATABASE IF NOT EXISTS ALX_prodev")
     cursor.close()
 
-def connect_to_prodev():
-    """Connect to ALX_prodev database"""
-    return mysql.connector.connect(
-        host="localhost",
-        user=os.getenv('DB_USER', 'root'),
-        password=os.getenv('DB_PASSWORD', ''),
-        database="ALX_prodev"
-    )
+def connect_to_prodev(allow_local_infile=False):
+    """Connect to ALX_prodev database
+
+    Returns a connection from the shared pool; close() gives it back.
+    LOAD DATA needs a dedicated connection, so allow_local_infile=True
+    opens a fresh one.
+    """
+    if allow_local_infile:
+        return pool.connect_prodev(allow_local_infile=True)
+    return pool.get_pool().checkout()
 
 def create_table(connection):
-    """Create user_data table"""
+    """Create user_data table with the active backend's DDL
+
+    On MySQL an existing table also gets any sort index it lacks (see
+    add_sort_indexes); SQLite's DDL already creates them if missing.
+    """
+    backend = backends.get_backend()
+    backend.create_user_table(connection)
+    if backend.name == "mysql":
+        add_sort_indexes(connection)
+
+def add_sort_indexes(connection):
+    """Add the age and email indexes to a user_data table that lacks them"""
     cursor = connection.cursor()
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_data (
-            user_id VARCHAR(36) PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            email VARCHAR(255) NOT NULL,
-            age DECIMAL(10,2) NOT NULL
-        )
+        SELECT DISTINCT index_name FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = 'user_data'
     """)
+    existing = {name for (name,) in cursor.fetchall()}
+    missing = [
+        f"ADD INDEX {name} ({column})"
+        for name, column in SORT_INDEXES if name not in existing
+    ]
+    if missing:
+        cursor.execute(f"ALTER TABLE user_data {', '.join(missing)}")
     cursor.close()
 
-def insert_data(connection, csv_file):
-    """Insert data from CSV"""
+def add_change_tracking(connection):
+    """Add the updated_at column and index to a user_data table that lacks it"""
     cursor = connection.cursor()
-    with open(csv_file) as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            cursor.execute("""
-                INSERT IGNORE INTO user_data 
-                VALUES (%s, %s, %s, %s)
-            """, (row['user_id'], row['name'], row['email'], row['age']))
-    connection.commit()
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+          AND table_name = 'user_data' AND column_name = 'updated_at'
+    """)
+    if not cursor.fetchone()[0]:
+        cursor.execute("""
+            ALTER TABLE user_data
+            ADD COLUMN updated_at TIMESTAMP(6) NOT NULL
+                DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+            ADD INDEX idx_user_data_updated_at (updated_at, user_id)
+        """)
     cursor.close()
+
+def read_csv_rows(csv_file):
+    """Stream (user_id, name, email, age) tuples from a CSV file"""
+    with open(csv_file, newline='') as f:
+        for row in csv.DictReader(f):
+            yield tuple(row[column] for column in USER_COLUMNS)
+
+def synthetic_rows(count, seed=0):
+    """Generate `count` deterministic fake users for fixtures and benchmarks"""
+    rng = random.Random(seed)
+    for i in range(count):
+        user_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        yield (user_id, f"User {i}", f"user{i}@example.com", rng.randint(18, 90))
+
+def report_progress(rows, elapsed):
+    """Print seeding throughput; insert_data's default `progress` callback"""
+    rate = rows / elapsed if elapsed else 0
+    print(f"{rows:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec)")
+
+def insert_rows(connection, rows, batch_size=BATCH_SIZE,
+                commit_every=COMMIT_EVERY, progress=None):
+    """Insert an iterable of user tuples in multi-row batches
+
+    executemany() folds each batch into a single INSERT ... VALUES (...),
+    (...) statement. The transaction is committed every `commit_every`
+    rows and `progress(rows, elapsed)` is called after each commit.
+    Returns the number of rows sent.
+    """
+    cursor = connection.cursor()
+    query = backends.get_backend().sql(
+        f"INSERT IGNORE INTO user_data ({', '.join(USER_COLUMNS)}) "
+        "VALUES (%s, %s, %s, %s)"
+    )
+    start = time.perf_counter()
+    total = uncommitted = 0
+    batch = []
+
+    def flush():
+        nonlocal total, uncommitted
+        cursor.executemany(query, batch)
+        total += len(batch)
+        uncommitted += len(batch)
+        batch.clear()
+
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+            if uncommitted >= commit_every:
+                connection.commit()
+                uncommitted = 0
+                if progress:
+                    progress(total, time.perf_counter() - start)
+        if batch:
+            flush()
+        connection.commit()
+    finally:
+        cursor.close()
+    if progress:
+        progress(total, time.perf_counter() - start)
+    return total
+
+def load_data_infile(connection, csv_file, progress=None):
+    """Bulk load a CSV with LOAD DATA LOCAL INFILE
+
+    The server parses the file itself, which is the fastest path for large
+    fixtures. Needs local_infile enabled on the server and a connection from
+    connect_to_prodev(allow_local_infile=True). Returns the rows inserted.
+    """
+    with open(csv_file, newline='') as f:
+        header = next(csv.reader(f))
+        f.seek(0)
+        terminator = '\\r\\n' if f.readline().endswith('\r\n') else '\\n'
+    unknown = set(header) - set(USER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unexpected CSV columns: {sorted(unknown)}")
+
+    start = time.perf_counter()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE user_data
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+            LINES TERMINATED BY '{terminator}'
+            IGNORE 1 LINES ({', '.join(header)})
+        """, (os.path.abspath(csv_file),))
+        loaded = cursor.rowcount
+        connection.commit()
+    finally:
+        cursor.close()
+    if progress:
+        progress(loaded, time.perf_counter() - start)
+    return loaded
+
+def insert_data(connection, csv_file, batch_size=BATCH_SIZE,
+                commit_every=COMMIT_EVERY, local_infile=False,
+                progress=report_progress):
+    """Insert data from CSV
+
+    Streams the file in batches via insert_rows(), or hands it to the server
+    with load_data_infile() when local_infile=True. Throughput is printed
+    with report_progress() unless another `progress` callback, or None, is
+    given.
+    """
+    if local_infile:
+        return load_data_infile(connection, csv_file, progress)
+    return insert_rows(
+        connection, read_csv_rows(csv_file), batch_size, commit_every, progress
+    )
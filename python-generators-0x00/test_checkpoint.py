@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Crash-and-resume tests for checkpoint.run_batches
+"""
+import collections
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import backends
+import checkpoint
+import seed
+
+ROWS = 95
+BATCH_SIZE = 10
+CRASH_AT = 4
+
+
+def log_batch(path, batch):
+    """Append the batch's user_ids to a file, durably"""
+    with open(path, "a") as f:
+        f.write("".join(f"{user['user_id']}\n" for user in batch))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def run_job(data_path, store_path, log_path, exactly_once, crash_at, when):
+    """Run the job in this process, dying abruptly in batch `crash_at`
+
+    when="before" dies before processing the batch, "during" half-way
+    through it and "after" once it is processed but not yet checkpointed.
+    """
+    backends.set_backend("sqlite", path=data_path)
+    seen = 0
+
+    def process(batch, conn=None):
+        nonlocal seen
+        seen += 1
+        if seen == crash_at and when == "before":
+            os._exit(1)
+        if exactly_once:
+            for i, user in enumerate(batch):
+                conn.execute(
+                    "INSERT INTO processed VALUES (?)", (user['user_id'],)
+                )
+                if seen == crash_at and when == "during" and i == len(batch) // 2:
+                    os._exit(1)
+        else:
+            log_batch(log_path, batch)
+        if seen == crash_at and when == "after":
+            os._exit(1)
+
+    store = checkpoint.CheckpointStore(store_path)
+    try:
+        return checkpoint.run_batches(
+            process, BATCH_SIZE, job="test", store=store,
+            exactly_once=exactly_once
+        )
+    finally:
+        store.close()
+
+
+class TestRunBatchesResume(unittest.TestCase):
+    """Kill run_batches part-way, rerun it and check every batch"""
+
+    def setUp(self) -> None:
+        """Seed a SQLite user_data table and empty checkpoint/output files"""
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.data_path = os.path.join(self.directory.name, "users.sqlite3")
+        self.store_path = os.path.join(self.directory.name, "checkpoints.sqlite3")
+        self.log_path = os.path.join(self.directory.name, "processed.log")
+
+        backend = backends.set_backend("sqlite", path=self.data_path)
+        with backend.connection() as conn:
+            backend.create_user_table(conn)
+            seed.insert_rows(conn, seed.synthetic_rows(ROWS))
+        conn = sqlite3.connect(self.data_path)
+        self.user_ids = sorted(row[0] for row in conn.execute(
+            "SELECT user_id FROM user_data"
+        ))
+        conn.close()
+
+        store = checkpoint.CheckpointStore(self.store_path)
+        store.conn.execute("CREATE TABLE processed (user_id TEXT)")
+        store.close()
+
+    def crash(self, exactly_once, when):
+        """Run the job in a child process that dies in batch CRASH_AT"""
+        context = multiprocessing.get_context("spawn")
+        child = context.Process(target=run_job, args=(
+            self.data_path, self.store_path, self.log_path,
+            exactly_once, CRASH_AT, when
+        ))
+        child.start()
+        child.join()
+        self.assertEqual(child.exitcode, 1)
+
+    def resume(self, exactly_once):
+        """Rerun the job to completion in this process"""
+        return run_job(
+            self.data_path, self.store_path, self.log_path,
+            exactly_once, crash_at=0, when=None
+        )
+
+    def logged(self):
+        """user_ids the at-least-once job wrote, in order"""
+        with open(self.log_path) as f:
+            return f.read().split()
+
+    def test_crash_between_batches_repeats_nothing(self) -> None:
+        """Dying before a batch starts resumes at exactly that batch"""
+        self.crash(exactly_once=False, when="before")
+        self.assertEqual(len(self.logged()), (CRASH_AT - 1) * BATCH_SIZE)
+
+        batches, rows = self.resume(exactly_once=False)
+        self.assertEqual(self.logged(), self.user_ids)
+        self.assertEqual((batches, rows), (10, ROWS))
+
+    def test_crash_before_checkpoint_repeats_one_batch(self) -> None:
+        """At-least-once: only the uncheckpointed batch runs twice"""
+        self.crash(exactly_once=False, when="after")
+        self.resume(exactly_once=False)
+
+        logged = self.logged()
+        self.assertEqual(sorted(set(logged)), self.user_ids)
+        repeated = [u for u, n in collections.Counter(logged).items() if n > 1]
+        crashed = self.user_ids[(CRASH_AT - 1) * BATCH_SIZE:CRASH_AT * BATCH_SIZE]
+        self.assertEqual(sorted(repeated), crashed)
+        self.assertEqual(len(logged), ROWS + BATCH_SIZE)
+
+    def test_exactly_once_survives_crash_mid_batch(self) -> None:
+        """Exactly-once: a half-written batch is rolled back and redone"""
+        self.crash(exactly_once=True, when="during")
+        self.crash(exactly_once=True, when="after")
+        batches, rows = self.resume(exactly_once=True)
+
+        conn = sqlite3.connect(self.store_path)
+        processed = [row[0] for row in conn.execute(
+            "SELECT user_id FROM processed ORDER BY user_id"
+        )]
+        conn.close()
+        self.assertEqual(processed, self.user_ids)
+        self.assertEqual((batches, rows), (10, ROWS))
+
+
+if __name__ == "__main__":
+    unittest.main()
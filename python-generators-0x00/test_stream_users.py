@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Memory tests for the streaming generators
+"""
+import tracemalloc
+import unittest
+
+import backends
+import seed
+
+stream = __import__('0-stream_users')
+ages = __import__('4-stream_ages')
+
+SMALL = 5_000
+LARGE = 50_000
+CHUNK_SIZE = 500
+
+
+def peak_memory(make_generator):
+    """Peak Python heap in bytes while building and draining a generator"""
+    tracemalloc.start()
+    try:
+        for _ in make_generator():
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class TestStreamingMemory(unittest.TestCase):
+    """Peak memory must not grow with the size of user_data"""
+
+    def peaks(self, make_generator):
+        """Peak memory of a full scan at SMALL and at LARGE rows"""
+        peaks = []
+        for rows in (SMALL, LARGE):
+            backend = backends.set_backend(
+                backends.MemoryBackend(f"user_data_{id(self)}_{rows}")
+            )
+            with backend.connection() as conn:
+                backend.create_user_table(conn)
+                seed.insert_rows(conn, seed.synthetic_rows(rows))
+            peaks.append(peak_memory(make_generator))
+        return peaks
+
+    def assertFlat(self, small, large) -> None:
+        """10x the rows may cost at most 1.5x the peak memory"""
+        self.assertLess(large, small * 1.5, f"{small:,} B -> {large:,} B")
+
+    def test_stream_users(self) -> None:
+        """stream_users holds one chunk of rows at a time"""
+        self.assertFlat(*self.peaks(lambda: stream.stream_users(CHUNK_SIZE)))
+
+    def test_stream_user_ages(self) -> None:
+        """stream_user_ages holds one chunk of ages at a time"""
+        self.assertFlat(*self.peaks(lambda: ages.stream_user_ages(CHUNK_SIZE)))
+
+    def test_fetch_all_grows(self) -> None:
+        """Control: buffering the whole table does grow with it"""
+        small, large = self.peaks(lambda: iter(backends.fetch_all(
+            "SELECT * FROM user_data"
+        )))
+        self.assertGreater(large, small * 5)
+
+
+if __name__ == "__main__":
+    unittest.main()